@@ -1 +1,2 @@
+from app.api.metrics import router as metrics_router
 from app.api.ws import router as ws_router
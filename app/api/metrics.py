@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.metrics import registry
+
+
+router = APIRouter()
+
+
+@router.get('/metrics', response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(registry.render(), media_type='text/plain; version=0.0.4')
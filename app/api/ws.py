@@ -10,8 +10,9 @@ from fastapi import (
 
 from app.config import settings
 from app.logging import logger
-from app.services import BattleService
-from app.ws import messenger
+from app.db import DBSession
+from app.services import BattleService, matchmaking_queue, provision_user
+from app.ws import messenger, negotiate_codec
 
 
 router = APIRouter()
@@ -39,16 +40,33 @@ async def websocket_endpoint(
     if user_id is None:
         return
 
-    await websocket.accept()
+    # the handshake completes only once the user exists
+    try:
+        async with DBSession() as db_session:
+            await provision_user(db_session, user_id)
+    except Exception as e:
+        logger.exception(e)
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+        return
+
+    # json text frames unless the client asks for the binary subprotocol
+    codec = negotiate_codec(websocket.scope.get('subprotocols', ()))
+    await websocket.accept(subprotocol=codec.subprotocol)
 
     try:
-        messenger.connect(user_id, websocket)
+        messenger.connect(user_id, websocket, codec)
         while True:
-            data: str = await websocket.receive_text()
-            await battle_service.process_message(data, websocket)
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                raise WebSocketDisconnect(message.get('code', status.WS_1000_NORMAL_CLOSURE))
+
+            # an empty text frame is still a text frame
+            data: t.Union[bytes, str] = message['text'] if 'text' in message else message['bytes']
+            await battle_service.process_message(codec.decode(data), websocket)
     except WebSocketDisconnect:
         pass
     except Exception as e:
         logger.exception(e)
     finally:
+        matchmaking_queue.discard(user_id, websocket)
         messenger.disconnect(user_id, websocket)
@@ -1,6 +1,7 @@
 import click
 
 from app.cli.db import cli as db_cli
+from app.cli.simulate import cli as simulate_cli
 
 
-cli = click.CommandCollection(sources=[db_cli,])
+cli = click.CommandCollection(sources=[db_cli, simulate_cli])
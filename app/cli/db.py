@@ -1,9 +1,12 @@
 import asyncio
 
 import click
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 
 from app.config import settings
 from app.db import create_db_schema, drop_db_schema, recreate_db_schema
+from app.services import sweep
+from app.services.migrations import migrate_battle_log
 
 
 @click.group()
@@ -27,3 +30,27 @@ def _drop_db_schema(db_uri: str) -> None:
 @click.option('--db_uri', type=str, default=settings.SQLALCHEMY_DATABASE_URL)
 def _recreate_db_schema(db_uri: str) -> None:
     asyncio.run(recreate_db_schema(db_uri))
+
+
+@cli.command('migrate_battle_log')
+@click.option('--db_uri', type=str, default=settings.SQLALCHEMY_DATABASE_URL)
+def _migrate_battle_log(db_uri: str) -> None:
+    asyncio.run(migrate_battle_log(db_uri))
+
+
+@cli.command('sweep')
+@click.option('--db_uri', type=str, default=settings.SQLALCHEMY_DATABASE_URL)
+@click.option('--battle_retention', type=int, default=settings.BATTLE_RETENTION)
+@click.option('--offer_retention', type=int, default=settings.BATTLE_OFFER_RETENTION)
+@click.option('--batch_size', type=int, default=settings.BATTLE_SWEEP_BATCH_SIZE)
+def _sweep(db_uri: str, battle_retention: int, offer_retention: int, batch_size: int) -> None:
+    async def _run() -> dict[str, int]:
+        engine = create_async_engine(db_uri, echo=settings.BATTLE_DEBUG)
+        try:
+            async with AsyncSession(engine) as db_session:
+                return await sweep(db_session, battle_retention, offer_retention, batch_size)
+        finally:
+            await engine.dispose()
+
+    processed = asyncio.run(_run())
+    click.echo(f'Deleted battles: {processed["battles"]}, offers: {processed["offers"]}')
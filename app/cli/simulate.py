@@ -0,0 +1,231 @@
+import asyncio
+import json
+import random
+import time
+import typing as t
+
+import click
+import websockets
+
+from app.config import settings
+
+
+class ActionStats:
+    """
+    Latencies (seconds) and errors per action
+    """
+    latencies: dict[str, list[float]]
+    errors: dict[str, int]
+
+    def __init__(self) -> None:
+        self.latencies = dict()
+        self.errors = dict()
+
+    def observe(self, action: str, latency: float) -> None:
+        self.latencies.setdefault(action, []).append(latency)
+
+    def error(self, action: str) -> None:
+        self.errors[action] = self.errors.get(action, 0) + 1
+
+    def report(self, elapsed: float) -> list[dict[str, t.Any]]:
+        report = []
+        for action in sorted(self.latencies.keys() | self.errors.keys()):
+            latencies = sorted(self.latencies.get(action, ()))
+            report.append({
+                'action': action,
+                'count': len(latencies),
+                'errors': self.errors.get(action, 0),
+                'rps': len(latencies) / elapsed if elapsed else 0.0,
+                'p50': self._percentile(latencies, 50),
+                'p90': self._percentile(latencies, 90),
+                'p99': self._percentile(latencies, 99),
+                'max': latencies[-1] if latencies else 0.0,
+            })
+
+        return report
+
+    @staticmethod
+    def _percentile(latencies: list[float], percent: int) -> float:
+        if not latencies:
+            return 0.0
+
+        return latencies[min(len(latencies) - 1, len(latencies) * percent // 100)]
+
+
+class Player:
+    """
+    Simulated user with one websocket
+    """
+    user_id: int
+    _ws: websockets.WebSocketClientProtocol
+    _stats: ActionStats
+
+    def __init__(self, user_id: int, ws: websockets.WebSocketClientProtocol, stats: ActionStats) -> None:
+        self.user_id = user_id
+        self._ws = ws
+        self._stats = stats
+
+    async def send(self, action: str, payload: dict[str, t.Any]) -> None:
+        await self._ws.send(json.dumps({
+            'action': action,
+            'payload': payload,
+        }))
+
+    async def receive(self, action: str) -> t.Any:
+        message = json.loads(await self._ws.recv())
+        if isinstance(message, dict) and 'error' in message:
+            self._stats.error(action)
+            raise RuntimeError(f'{action} failed: {message}')
+
+        return message
+
+    async def request(self, action: str, payload: dict[str, t.Any]) -> t.Any:
+        started = time.perf_counter()
+        await self.send(action, payload)
+        message = await self.receive(action)
+        self._stats.observe(action, time.perf_counter() - started)
+
+        return message
+
+
+class Simulation:
+    """
+    Pairs of players running the create -> list -> accept -> start -> move loop
+    through the websocket endpoint
+    """
+    url: str
+    players: int
+    duration: float
+    think_time: float
+    user_id_start: int
+    stats: ActionStats
+    _deadline: float
+
+    def __init__(
+        self,
+        url: str,
+        players: int,
+        duration: float,
+        think_time: float,
+        user_id_start: int
+    ) -> None:
+        self.url = url
+        self.players = players
+        self.duration = duration
+        self.think_time = think_time
+        self.user_id_start = user_id_start
+        self.stats = ActionStats()
+        self._deadline = 0.0
+
+    async def run(self) -> float:
+        """
+        Run battles until the duration is over, returns elapsed time
+        """
+        started = time.perf_counter()
+        self._deadline = started + self.duration
+        await asyncio.gather(*(
+            self._run_pair(self.user_id_start + i, self.user_id_start + i + 1)
+            for i in range(0, self.players - self.players % 2, 2)
+        ))
+
+        return time.perf_counter() - started
+
+    async def _run_pair(self, creator_id: int, acceptor_id: int) -> None:
+        async with self._connect(creator_id) as creator_ws, self._connect(acceptor_id) as acceptor_ws:
+            creator = Player(creator_id, creator_ws, self.stats)
+            acceptor = Player(acceptor_id, acceptor_ws, self.stats)
+            while time.perf_counter() < self._deadline:
+                try:
+                    await self._battle(creator, acceptor)
+                except RuntimeError as e:
+                    # replies of the broken battle may still be in flight
+                    click.echo(e, err=True)
+                    return
+
+    def _connect(self, user_id: int) -> websockets.connect:
+        return websockets.connect(
+            self.url,
+            extra_headers={settings.BATTLE_USERNAME_HEADER: str(user_id)}
+        )
+
+    async def _battle(self, creator: Player, acceptor: Player) -> None:
+        offer = await creator.request('battles_create', {'userId': creator.user_id})
+        await self._think()
+        await acceptor.request('battles_list', {})
+        await self._think()
+        accept = await acceptor.request('battles_accept', {
+            'userId': acceptor.user_id,
+            'offerId': offer['offerId'],
+        })
+        battle = await acceptor.request('battles_start', {
+            'acceptId': accept['acceptId'],
+            'offerId': offer['offerId'],
+        })
+        await creator.receive('battles_start')
+
+        hp = {creator.user_id: settings.BATTLE_USER_HP, acceptor.user_id: settings.BATTLE_USER_HP}
+        battle_round = 0
+        while True:
+            await self._think()
+            await creator.send('battles_move', self._move(creator, battle['battleId'], battle_round))
+            await self._think()
+            # the second move resolves the round
+            round_info = await acceptor.request(
+                'battles_move',
+                self._move(acceptor, battle['battleId'], battle_round)
+            )
+            await creator.receive('battles_move')
+
+            if (round_winner := round_info['roundWinner']['userId']) is not None:
+                loser = acceptor.user_id if round_winner == creator.user_id else creator.user_id
+                hp[loser] -= round_info['roundDamage']
+                if hp[loser] <= 0:
+                    await creator.receive('battles_finish')
+                    await acceptor.receive('battles_finish')
+                    return
+
+            battle_round += 1
+
+    @staticmethod
+    def _move(player: Player, battle_id: int, battle_round: int) -> dict[str, t.Any]:
+        return {
+            'userId': player.user_id,
+            'battleId': battle_id,
+            'round': battle_round,
+            'choice': random.randrange(3),
+        }
+
+    async def _think(self) -> None:
+        if self.think_time:
+            await asyncio.sleep(random.uniform(0, 2 * self.think_time))
+
+
+@click.group()
+def cli() -> None:
+    pass
+
+
+@cli.command('simulate')
+@click.option('--url', type=str, default=f'ws://localhost:{settings.BATTLE_WS_PORT}/')
+@click.option('--players', type=int, default=100, help='Number of concurrent players (pairs battle each other)')
+@click.option('--duration', type=float, default=60.0, help='Seconds to start new battles for')
+@click.option('--think_time', type=float, default=0.0, help='Mean pause (seconds) between player actions')
+@click.option('--user_id_start', type=int, default=1)
+def _simulate(
+    url: str,
+    players: int,
+    duration: float,
+    think_time: float,
+    user_id_start: int
+) -> None:
+    simulation = Simulation(url, players, duration, think_time, user_id_start)
+    elapsed = asyncio.run(simulation.run())
+
+    click.echo(f'{players} players, {elapsed:.1f}s')
+    click.echo(f'{"action":<16}{"count":>10}{"errors":>8}{"rps":>10}{"p50 ms":>10}{"p90 ms":>10}{"p99 ms":>10}{"max ms":>10}')
+    for row in simulation.stats.report(elapsed):
+        click.echo(
+            f'{row["action"]:<16}{row["count"]:>10}{row["errors"]:>8}{row["rps"]:>10.1f}'
+            f'{row["p50"] * 1000:>10.1f}{row["p90"] * 1000:>10.1f}'
+            f'{row["p99"] * 1000:>10.1f}{row["max"] * 1000:>10.1f}'
+        )
@@ -0,0 +1,55 @@
+import random
+import time
+import typing as t
+from datetime import datetime, timedelta
+
+
+class Clock:
+    """
+    Source of time and randomness of the app, tests may freeze the time and seed the RNG
+    """
+    _frozen_at: t.Optional[tuple[datetime, float]]  # (utc time, monotonic time)
+    _random: random.Random
+
+    def __init__(self) -> None:
+        self._frozen_at = None
+        self._random = random.Random()
+
+    @property
+    def random(self) -> random.Random:
+        return self._random
+
+    def utcnow(self) -> datetime:
+        if self._frozen_at is not None:
+            return self._frozen_at[0]
+
+        return datetime.utcnow()
+
+    def monotonic(self) -> float:
+        if self._frozen_at is not None:
+            return self._frozen_at[1]
+
+        return time.monotonic()
+
+    def randint(self, a: int, b: int) -> int:
+        return self._random.randint(a, b)
+
+    def freeze(self, now: t.Optional[datetime] = None) -> None:
+        self._frozen_at = (now or datetime.utcnow(), time.monotonic())
+
+    def advance(self, seconds: float) -> None:
+        if self._frozen_at is None:
+            raise RuntimeError('Clock is not frozen')
+
+        now, monotonic = self._frozen_at
+        self._frozen_at = (now + timedelta(seconds=seconds), monotonic + seconds)
+
+    def seed(self, seed: t.Any) -> None:
+        self._random.seed(seed)
+
+    def reset(self) -> None:
+        self._frozen_at = None
+        self._random = random.Random()
+
+
+clock = Clock()
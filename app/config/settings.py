@@ -12,20 +12,46 @@ class Settings(BaseSettings):
     DB_USER: str = 'admin'
     DB_USER_PASSWORD: str = 'password'
     DB_API: str = 'asyncpg'
+    DB_POOL_SIZE: int = 10
+    DB_POOL_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800  # 30 min
+    DB_POOL_PRE_PING: bool = True
 
     # app
     BATTLE_DEBUG: bool = False
+    BATTLE_LOG_CALLSITE: bool = True  # file, line and function of the log call
+    BATTLE_LOG_SORT_KEYS: bool = False
+    BATTLE_LOG_QUEUE: bool = True  # render and write logs in a background thread
     BATTLE_WS_HOST: str = '0.0.0.0'
     BATTLE_WS_PORT: int = 8899
     BATTLE_WS_LOOP: str = 'auto'
     BATTLE_WS_PROTOCOL_TYPE: str = 'auto'
     BATTLE_WS_PING_INTERVAL: int = 5
     BATTLE_WS_PING_TIMEOUT: int = 5
+    BATTLE_WS_QUEUE_SIZE: int = 64
+    BATTLE_WS_QUEUE_POLICY: str = 'drop_oldest'  # drop_oldest | coalesce | disconnect
     BATTLE_OFFER_EXPIRES: int = 300  # 5 min
+    BATTLE_ROUND_TIMEOUT: float = 30.0  # sec to make a move, 0 - disabled
+    BATTLE_ROUND_RETRY_DELAY: float = 1.0  # sec before a failed round expiry is retried
+    BATTLE_OFFERS_LIMIT: int = 50
+    BATTLE_OFFERS_CACHE_TTL: float = 1.0  # sec
     BATTLE_USER_HP: int = 100
     BATTLE_USER_DAMAGE_MIN: int = 10
     BATTLE_USER_DAMAGE_MAX: int = 20
     BATTLE_USERNAME_HEADER: str = 'x-http-username'
+    BATTLE_KNOWN_USERS_CACHE_SIZE: int = 100000
+    BATTLE_BATCH_MAX_SIZE: int = 32
+    BATTLE_MATCHMAKING_BUCKET_SIZE: int = 100  # rating points per bucket
+    BATTLE_MATCHMAKING_WIDEN_INTERVAL: float = 5.0  # sec of waiting per extra bucket, 0 - never widen
+    BATTLE_MATCHMAKING_MAX_WIDEN: int = 3  # buckets
+    BATTLE_STATE_FLUSH_INTERVAL: float = 1.0  # sec
+    BATTLE_STATE_FLUSH_SIZE: int = 100
+    BATTLE_EVENTS_BUFFER_SIZE: int = 16  # recent messages per battle, for `battles_resume`
+    BATTLE_SWEEP_INTERVAL: int = 600  # 10 min, 0 - disabled
+    BATTLE_SWEEP_BATCH_SIZE: int = 1000
+    BATTLE_OFFER_RETENTION: int = 3600  # 1 hour after expiration
+    BATTLE_RETENTION: int = 86400  # 1 day after finish
 
     class Config:
         env_file = '.env'
@@ -37,24 +63,34 @@ class Settings(BaseSettings):
             f'{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}'
         )
 
+    @property
+    def POSTGRES_DSN(self) -> str:  # noqa
+        return (
+            f'postgresql://{self.DB_USER}:{self.DB_USER_PASSWORD}@'
+            f'{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}'
+        )
+
     @property
     def LOGGING(self) -> dict[str, t.Any]:  # noqa
         json_params = {
             'ensure_ascii': False,
-            'sort_keys': True,
+            'sort_keys': self.BATTLE_LOG_SORT_KEYS,
         }
         if self.BATTLE_DEBUG:
             json_params['indent'] = 2
 
+        log_callsite = self.BATTLE_LOG_CALLSITE
+
         def add_app_context(_, __, event_dict: dict[str, t.Any]) -> dict[str, t.Any]:
             # remove processors meta
             event_dict.pop('_from_structlog')
-            event_dict.pop('_record')
+            record = event_dict.pop('_record')
 
-            frame, _ = structlog._frames._find_first_app_frame_and_name(['logging', __name__])  # noqa
-            event_dict['file'] = frame.f_code.co_filename
-            event_dict['line'] = frame.f_lineno
-            event_dict['function'] = frame.f_code.co_name
+            # the call site is already known by the stdlib record, no frame walking
+            if log_callsite:
+                event_dict['file'] = record.pathname
+                event_dict['line'] = record.lineno
+                event_dict['function'] = record.funcName
 
             return event_dict
 
@@ -89,7 +125,11 @@ class Settings(BaseSettings):
             'handlers': {
                 'console': {
                     'level': 'DEBUG' if self.BATTLE_DEBUG else 'INFO',
-                    'class': 'logging.StreamHandler',
+                    **(
+                        {'()': 'app.logging.QueueHandler'}
+                        if self.BATTLE_LOG_QUEUE else
+                        {'class': 'logging.StreamHandler'}
+                    ),
                     'formatter': 'json',
                     'stream': 'ext://sys.stdout',
                 },
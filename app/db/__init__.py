@@ -5,4 +5,13 @@ from app.db.base import (
     recreate_db_schema
 )
 from app.db.models import *
-from app.db.session import DBSession, get_db_session
+from app.db.session import (
+    commit_stats,
+    count_commits,
+    DBSession,
+    dispose_db_engine,
+    get_db_pool_stats,
+    get_db_session,
+    init_db_engine,
+    query_stats,
+)
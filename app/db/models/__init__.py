@@ -1,6 +1,8 @@
 from app.db.models.battle import (
     Battle,
+    BattleAnswer,
     BattleOffer,
     BattleOfferAccept,
+    BattleRound,
     BattleUser,
 )
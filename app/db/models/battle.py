@@ -1,16 +1,21 @@
-from datetime import datetime, timedelta
+from datetime import timedelta
 
 from sqlalchemy import (
     BIGINT,
     Column,
     ForeignKey,
+    Index,
+    INTEGER,
+    SMALLINT,
     text,
+    TIMESTAMP,
     UniqueConstraint,
 )
-from sqlalchemy.dialects.postgresql import ENUM, JSONB
+from sqlalchemy.dialects.postgresql import ENUM
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 
+from app.clock import clock
 from app.config import settings
 from app.db.base import DeclarativeBase
 from app.db.models.mixins import TimeMarksMixin
@@ -58,10 +63,15 @@ class BattleOffer(DeclarativeBase, TimeMarksMixin):
     def is_active(self) -> bool:
         return (
             self.time_created > (
-                datetime.utcnow() - timedelta(seconds=settings.BATTLE_OFFER_EXPIRES)
+                clock.utcnow() - timedelta(seconds=settings.BATTLE_OFFER_EXPIRES)
             )
         )
 
+    # meta
+    __table_args__ = (
+        Index('battle_offer_time_created_idx', 'time_created'),
+    )
+
 
 class BattleOfferAccept(DeclarativeBase, TimeMarksMixin):
     __tablename__ = 'battle_offer_accept'
@@ -101,12 +111,25 @@ class Battle(DeclarativeBase, TimeMarksMixin):
         nullable=False
     )
     status = Column(ENUM(BattleStatus, enum='battle_status'), nullable=False)
-    log = Column(
-        JSONB,
-        nullable=False,
-        default=dict(),
-        server_default=text('\'{}\'::jsonb')
+    offer_creator_id = Column(
+        BIGINT,
+        ForeignKey('battle_user.user_id', onupdate='CASCADE', ondelete='CASCADE'),
+        nullable=False
+    )
+    offer_acceptor_id = Column(
+        BIGINT,
+        ForeignKey('battle_user.user_id', onupdate='CASCADE', ondelete='CASCADE'),
+        nullable=False
+    )
+    current_round = Column(INTEGER, nullable=False, default=0, server_default=text('0'))
+    offer_creator_hp = Column(INTEGER, nullable=False)
+    offer_acceptor_hp = Column(INTEGER, nullable=False)
+    winner_id = Column(
+        BIGINT,
+        ForeignKey('battle_user.user_id', onupdate='CASCADE', ondelete='CASCADE'),
+        nullable=True
     )
+    time_finished = Column(TIMESTAMP, nullable=True)
 
     # relations
     accept = relationship(
@@ -115,12 +138,50 @@ class Battle(DeclarativeBase, TimeMarksMixin):
         back_populates='battle'
     )
 
-    # utils
-    @property
-    def current_round(self) -> int:
-        return int(self.log['current_round'])
-
     # meta
     __table_args__ = (
         UniqueConstraint(accept_id, name='battle_accept_id_key'),
+        Index('battle_time_finished_idx', time_finished),
+    )
+
+
+class BattleRound(DeclarativeBase, TimeMarksMixin):
+    """
+    Resolved battle round, append-only
+    """
+    __tablename__ = 'battle_round'
+
+    # columns
+    battle_id = Column(
+        BIGINT,
+        ForeignKey('battle.battle_id', onupdate='CASCADE', ondelete='CASCADE'),
+        primary_key=True
+    )
+    round = Column(INTEGER, primary_key=True)
+    round_winner_id = Column(
+        BIGINT,
+        ForeignKey('battle_user.user_id', onupdate='CASCADE', ondelete='CASCADE'),
+        nullable=True
+    )
+    round_damage = Column(INTEGER, nullable=False, default=0, server_default=text('0'))
+
+
+class BattleAnswer(DeclarativeBase, TimeMarksMixin):
+    """
+    User move in a battle round, append-only
+    """
+    __tablename__ = 'battle_answer'
+
+    # columns
+    battle_id = Column(
+        BIGINT,
+        ForeignKey('battle.battle_id', onupdate='CASCADE', ondelete='CASCADE'),
+        primary_key=True
+    )
+    round = Column(INTEGER, primary_key=True)
+    user_id = Column(
+        BIGINT,
+        ForeignKey('battle_user.user_id', onupdate='CASCADE', ondelete='CASCADE'),
+        primary_key=True
     )
+    choice = Column(SMALLINT, nullable=False)
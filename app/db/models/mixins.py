@@ -1,16 +1,16 @@
-from datetime import datetime
-
 from sqlalchemy import (
     Column,
     text,
     TIMESTAMP,
 )
 
+from app.clock import clock
+
 
 class TimeMarksMixin:
     time_created = Column(
         TIMESTAMP,
         nullable=False,
-        default=datetime.utcnow,
+        default=clock.utcnow,
         server_default=text('CURRENT_TIMESTAMP')
     )
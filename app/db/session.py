@@ -1,35 +1,108 @@
+import time
 import typing as t
+from contextlib import contextmanager
+from contextvars import ContextVar
 from types import TracebackType
 
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
     create_async_engine,
 )
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
+import app.metrics as metrics
 from app.config import settings
 from app.logging import logger
 
 
-class DBSession:
-    _engine: AsyncEngine
-    _session: AsyncSession
+class DBPool(AsyncAdaptedQueuePool):
+    """
+    Async queue pool which counts checkouts that had to wait for a free connection
+    """
+    waits: int
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.waits = 0
+
+    def _do_get(self):
+        if (
+            self._max_overflow > -1
+            and self._overflow >= self._max_overflow
+            and self._pool.empty()
+        ):
+            self.waits += 1
+
+        return super()._do_get()
+
+
+_engine: t.Optional[AsyncEngine] = None
+_session_factory: t.Optional[sessionmaker] = None
 
-    def __init__(self, echo: bool = settings.BATTLE_DEBUG):
-        self._engine = create_async_engine(
+
+def init_db_engine(echo: bool = settings.BATTLE_DEBUG) -> AsyncEngine:
+    """
+    Create the application-wide engine (once per process)
+    """
+    global _engine, _session_factory
+
+    if _engine is None:
+        _engine = create_async_engine(
             settings.SQLALCHEMY_DATABASE_URL,
-            echo=echo
+            echo=echo,
+            poolclass=DBPool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_POOL_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING
         )
-
-    async def __aenter__(self) -> AsyncSession:
-        self._session = sessionmaker(
+        _session_factory = sessionmaker(
             autocommit=False,
             autoflush=False,
             expire_on_commit=False,
             class_=AsyncSession,
-            bind=self._engine
-        )()
+            bind=_engine
+        )
+
+    return _engine
+
+
+async def dispose_db_engine() -> None:
+    global _engine, _session_factory
+
+    if _engine is not None:
+        await _engine.dispose()
+        _engine, _session_factory = None, None
+
+
+def get_db_pool_stats() -> dict[str, int]:
+    if _engine is None:
+        return {}
+
+    pool: DBPool = _engine.sync_engine.pool  # noqa
+    return {
+        'size': pool.size(),
+        'checked_in': pool.checkedin(),
+        'checked_out': pool.checkedout(),
+        'overflow': pool.overflow(),
+        'waits': pool.waits,
+    }
+
+
+class DBSession:
+    _session: t.Optional[AsyncSession]
+
+    def __init__(self) -> None:
+        self._session = None
+
+    async def __aenter__(self) -> AsyncSession:
+        init_db_engine()
+        self._session = _session_factory()
         return self._session
 
     async def __aexit__(
@@ -46,6 +119,86 @@ class DBSession:
             await self._session.close()
 
 
+class CommitCounter:
+    """
+    Commits and queries of one action
+    """
+    count: int
+    queries: int
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.queries = 0
+
+
+class CommitStats:
+    """
+    Commits (or queries) per action: number of observations and max count
+    """
+    _actions: dict[str, int]
+    _max_commits: dict[str, int]
+
+    def __init__(self) -> None:
+        self._actions = dict()
+        self._max_commits = dict()
+
+    def observe(self, action: str, commits: int) -> None:
+        self._actions[action] = self._actions.get(action, 0) + 1
+        self._max_commits[action] = max(self._max_commits.get(action, 0), commits)
+
+    def max(self, action: str) -> int:
+        return self._max_commits.get(action, 0)
+
+    def actions(self) -> dict[str, int]:
+        return dict(self._actions)
+
+    def reset(self) -> None:
+        self._actions.clear()
+        self._max_commits.clear()
+
+
+_commit_counter: ContextVar[t.Optional[CommitCounter]] = ContextVar('commit_counter', default=None)
+commit_stats = CommitStats()
+query_stats = CommitStats()
+
+
+@contextmanager
+def count_commits() -> t.Iterator[CommitCounter]:
+    """
+    Count commits and queries of all sessions used in the current context (e.g. in one action)
+    """
+    counter = CommitCounter()
+    token = _commit_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _commit_counter.reset(token)
+
+
+@event.listens_for(Session, 'after_commit')
+def _count_commit(_: Session) -> None:
+    if (counter := _commit_counter.get()) is not None:
+        counter.count += 1
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(connection, *_) -> None:
+    connection.info.setdefault('query_started', []).append(time.perf_counter())
+    if (counter := _commit_counter.get()) is not None:
+        counter.queries += 1
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _stop_query_timer(connection, *_) -> None:
+    metrics.add_db_time(time.perf_counter() - connection.info['query_started'].pop())
+
+
+@event.listens_for(Engine, 'handle_error')
+def _drop_query_timer(context) -> None:
+    if context.connection is not None and (started := context.connection.info.get('query_started')):
+        started.pop()
+
+
 async def get_db_session() -> t.AsyncIterator[AsyncSession]:
     async with DBSession() as db_session:
         yield db_session
@@ -0,0 +1,72 @@
+import asyncio
+import typing as t
+from contextlib import contextmanager
+
+
+Handler = t.Callable[[dict[str, t.Any]], None]
+
+
+class Events:
+    """
+    Hooks for tests: wait for or record app events (e.g. `round_resolved`, `message_delivered`)
+    instead of sleeping. Emitting an event without subscribers is a dict lookup.
+    """
+    _handlers: dict[str, list[Handler]]
+
+    def __init__(self) -> None:
+        self._handlers = dict()
+
+    def emit(self, name: str, **data: t.Any) -> None:
+        for handler in self._handlers.get(name, ()):
+            handler(data)
+
+    def subscribe(self, name: str, handler: Handler) -> t.Callable[[], None]:
+        """
+        Returns a callable which unsubscribes the handler
+        """
+        self._handlers.setdefault(name, []).append(handler)
+
+        def unsubscribe() -> None:
+            handlers = self._handlers.get(name, [])
+            if handler in handlers:
+                handlers.remove(handler)
+            if not handlers:
+                self._handlers.pop(name, None)
+
+        return unsubscribe
+
+    @contextmanager
+    def record(self, name: str) -> t.Iterator[list[dict[str, t.Any]]]:
+        """
+        Collect data of events emitted inside the block
+        """
+        recorded: list[dict[str, t.Any]] = []
+        unsubscribe = self.subscribe(name, recorded.append)
+        try:
+            yield recorded
+        finally:
+            unsubscribe()
+
+    async def wait_for(
+        self,
+        name: str,
+        predicate: t.Optional[t.Callable[[dict[str, t.Any]], bool]] = None,
+        timeout: t.Optional[float] = None
+    ) -> dict[str, t.Any]:
+        """
+        Wait for the next event (matching the predicate), returns its data
+        """
+        future = asyncio.get_running_loop().create_future()
+
+        def handler(data: dict[str, t.Any]) -> None:
+            if not future.done() and (predicate is None or predicate(data)):
+                future.set_result(data)
+
+        unsubscribe = self.subscribe(name, handler)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            unsubscribe()
+
+
+events = Events()
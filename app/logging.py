@@ -1,4 +1,37 @@
 import logging
+import logging.handlers
+import queue
+import typing as t
 
 
 logger = logging.getLogger('battle_app')
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to a listener thread, which formats (renders) them
+    and writes them to the stream, off the event loop
+    """
+    handler: logging.Handler
+    listener: t.Optional[logging.handlers.QueueListener]
+
+    def __init__(self, stream: t.Optional[t.TextIO] = None) -> None:
+        super().__init__(queue.SimpleQueue())
+        self.handler = logging.StreamHandler(stream)
+        self.listener = logging.handlers.QueueListener(self.queue, self.handler)
+        self.listener.start()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the record stays in this process, so it is formatted lazily by the listener
+        return record
+
+    def setFormatter(self, fmt: t.Optional[logging.Formatter]) -> None:  # noqa
+        self.handler.setFormatter(fmt)
+
+    def close(self) -> None:
+        if self.listener is not None:
+            # writes out queued records
+            self.listener.stop()
+            self.listener = None
+            self.handler.close()
+        super().close()
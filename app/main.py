@@ -1,7 +1,35 @@
 from fastapi import FastAPI
 
-from app.api import ws_router
+from app.api import metrics_router, ws_router
+from app.db import dispose_db_engine, get_db_pool_stats, init_db_engine
+from app.metrics import GaugeCollector, registry
+from app.services import battle_state_store, BattleService, round_timer, sweeper
+from app.ws import messenger
 
 
 app: FastAPI = FastAPI()
 app.include_router(ws_router, prefix='', tags=['ws'])
+app.include_router(metrics_router, prefix='', tags=['metrics'])
+
+registry.register(GaugeCollector('battle_ws', 'Websocket connections and outbound queues', messenger.stats))
+registry.register(GaugeCollector('battle_db_pool', 'Database connection pool', get_db_pool_stats))
+registry.register(GaugeCollector('battle_round_timer', 'Round move deadlines', round_timer.stats))
+
+
+@app.on_event('startup')
+async def on_startup() -> None:
+    init_db_engine()
+    await messenger.start()
+    await battle_state_store.start()
+    # restored active battles get a full move deadline
+    await round_timer.start(BattleService().expire_round, battle_state_store.active_rounds())
+    await sweeper.start()
+
+
+@app.on_event('shutdown')
+async def on_shutdown() -> None:
+    await sweeper.stop()
+    await round_timer.stop()
+    await battle_state_store.stop()
+    await messenger.stop()
+    await dispose_db_engine()
@@ -0,0 +1,210 @@
+import bisect
+import time
+import typing as t
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names: t.Sequence[str], values: t.Sequence[str], **extra: str) -> str:
+    pairs = [*zip(names, values), *extra.items()]
+    if not pairs:
+        return ''
+
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + '}'
+
+
+class Metric:
+    name: str
+    help: str
+    type: str
+    label_names: tuple[str, ...]
+
+    def __init__(self, name: str, help: str, label_names: t.Sequence[str] = ()) -> None:  # noqa
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+
+    def render(self) -> t.Iterator[str]:
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} {self.type}'
+        yield from self._samples()
+
+    def _samples(self) -> t.Iterator[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = 'counter'
+    _values: dict[tuple[str, ...], float]
+
+    def __init__(self, name: str, help: str, label_names: t.Sequence[str] = ()) -> None:  # noqa
+        super().__init__(name, help, label_names)
+        self._values = dict()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def _samples(self) -> t.Iterator[str]:
+        for label_values, value in self._values.items():
+            yield f'{self.name}{_labels(self.label_names, label_values)} {value}'
+
+
+class Histogram(Metric):
+    type = 'histogram'
+    buckets: tuple[float, ...]
+    # label values -> [bucket counts..., sum, count]
+    _values: dict[tuple[str, ...], list[float]]
+
+    def __init__(
+        self,
+        name: str,
+        help: str,  # noqa
+        label_names: t.Sequence[str] = (),
+        buckets: t.Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, help, label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._values = dict()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        if (values := self._values.get(label_values, None)) is None:
+            values = self._values[label_values] = [0] * (len(self.buckets) + 2)
+
+        # not cumulative, buckets are summed up on render
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            values[index] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def count(self, *label_values: str) -> int:
+        return int(self._values.get(label_values, (0,))[-1])
+
+    def _samples(self) -> t.Iterator[str]:
+        for label_values, values in self._values.items():
+            cumulative = 0
+            for bucket, bucket_count in zip(self.buckets, values):
+                cumulative += bucket_count
+                labels = _labels(self.label_names, label_values, le=str(bucket))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            yield f'{self.name}_bucket{_labels(self.label_names, label_values, le="+Inf")} {values[-1]}'
+            labels = _labels(self.label_names, label_values)
+            yield f'{self.name}_sum{labels} {values[-2]}'
+            yield f'{self.name}_count{labels} {values[-1]}'
+
+
+class GaugeCollector(Metric):
+    """
+    Gauges read from a callable at scrape time, `{name}_{key}` for every key of its result
+    """
+    type = 'gauge'
+    _collect: t.Callable[[], dict[str, float]]
+
+    def __init__(self, name: str, help: str, collect: t.Callable[[], dict[str, float]]) -> None:  # noqa
+        super().__init__(name, help)
+        self._collect = collect
+
+    def render(self) -> t.Iterator[str]:
+        for key, value in self._collect().items():
+            yield f'# HELP {self.name}_{key} {self.help}'
+            yield f'# TYPE {self.name}_{key} {self.type}'
+            yield f'{self.name}_{key} {value}'
+
+
+class Registry:
+    _metrics: dict[str, Metric]
+
+    def __init__(self) -> None:
+        self._metrics = dict()
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """
+        Prometheus text exposition format
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+action_duration: Histogram = registry.register(Histogram(
+    'battle_action_duration_seconds', 'Time to process an incoming action', ('action',)
+))
+action_db_duration: Histogram = registry.register(Histogram(
+    'battle_action_db_seconds', 'Time spent in database queries per action', ('action',)
+))
+action_send_duration: Histogram = registry.register(Histogram(
+    'battle_action_send_seconds', 'Time spent sending (queueing) replies per action', ('action',)
+))
+action_errors: Counter = registry.register(Counter(
+    'battle_action_errors_total', 'Failed actions by error type', ('action', 'type')
+))
+
+
+class ActionTimings:
+    __slots__ = ('db', 'send', 'error')
+
+    db: float
+    send: float
+    error: t.Optional[str]  # validation, unexpected or domain
+
+    def __init__(self) -> None:
+        self.db = 0.0
+        self.send = 0.0
+        self.error = None
+
+
+_timings: ContextVar[t.Optional[ActionTimings]] = ContextVar('action_timings', default=None)
+
+
+@contextmanager
+def track_action(action: str) -> t.Iterator[ActionTimings]:
+    """
+    Observe duration, db / send time and error of the action processed in the block
+    """
+    timings = ActionTimings()
+    token = _timings.set(timings)
+    started = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+        action_duration.observe(time.perf_counter() - started, action)
+        action_db_duration.observe(timings.db, action)
+        action_send_duration.observe(timings.send, action)
+        if timings.error is not None:
+            action_errors.inc(action, timings.error)
+
+
+def add_db_time(seconds: float) -> None:
+    if (timings := _timings.get()) is not None:
+        timings.db += seconds
+
+
+def add_send_time(seconds: float) -> None:
+    if (timings := _timings.get()) is not None:
+        timings.send += seconds
+
+
+def set_error(error: str, override: bool = True) -> None:
+    if (timings := _timings.get()) is not None and (override or timings.error is None):
+        timings.error = error
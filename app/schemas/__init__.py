@@ -3,6 +3,9 @@ from app.schemas.battle import (
     BattleMove,
     BattleOffer,
     BattleOfferAccept,
+    BattleOffersList,
+    BattleQueue,
+    BattleResume,
     BattleUser,
 )
 from app.schemas.message import IncomingMessage
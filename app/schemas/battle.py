@@ -1,3 +1,5 @@
+import typing as t
+
 from pydantic import (
     BaseConfig,
     BaseModel,
@@ -5,6 +7,7 @@ from pydantic import (
     validator,
 )
 
+from app.config import settings
 from app.schemas.enum import RockPaperScissorsChoice
 
 
@@ -51,6 +54,33 @@ class BattleMove(BaseBattle, BaseBattleUser):
         return value
 
 
+class BattleResume(BaseBattle, BaseBattleUser):
+    last_seq: t.Optional[int] = Field(None, alias='lastSeq')
+
+
+class BattleQueue(BaseBattleUser):
+    rating: t.Optional[int] = None
+
+    @validator('rating')
+    def _rating(cls, value: t.Optional[int]) -> t.Optional[int]:  # noqa
+        if value is not None and value < 0:
+            raise ValueError('Rating must be a positive integer')
+        return value
+
+
+class BattleOffersList(BaseModel):
+    limit: int = settings.BATTLE_OFFERS_LIMIT
+    after_offer_id: t.Optional[int] = Field(None, alias='afterOfferId')
+
+    @validator('limit')
+    def _limit(cls, value: int) -> int:  # noqa
+        if not 0 < value <= settings.BATTLE_OFFERS_LIMIT:
+            raise ValueError(
+                f'Limit must be a positive integer not greater than {settings.BATTLE_OFFERS_LIMIT}'
+            )
+        return value
+
+
 # orm
 class BattleUser(BaseBattleUser):
     class Config(BaseBattleConfig):
@@ -1 +1,10 @@
 from app.services.battle import BattleService
+from app.services.matchmaking import matchmaking_queue, MatchmakingQueue
+from app.services.state import (
+    battle_state_store,
+    BattleState,
+    BattleStateStore,
+)
+from app.services.sweeper import sweep, sweeper
+from app.services.timers import round_timer, RoundTimer
+from app.services.users import ensure_user, known_users, provision_user
@@ -1,51 +1,123 @@
-import json
 import typing as t
-from random import randint
+from contextlib import contextmanager
+from contextvars import ContextVar
 
-from fastapi import Depends, WebSocket
+from fastapi import WebSocket
 from pydantic import ValidationError
-from sqlalchemy import select
+from sqlalchemy import exists, literal, select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm.attributes import flag_modified
 
 import app.db.models as m
+import app.metrics as metrics
 import app.schemas as s
 from app.config import settings
-from app.db.session import get_db_session
+from app.db.session import commit_stats, count_commits, DBSession, query_stats
+from app.events import events
 from app.logging import logger
-from app.schemas.enum import BattleStatus, RockPaperScissorsChoice
+from app.schemas.enum import BattleStatus
+from app.services import engine
+from app.services.cache import TTLCache
+from app.services.matchmaking import matchmaking_queue, MatchmakingQueue, Ticket
+from app.services.state import (
+    battle_state_store,
+    BattleRound,
+    BattleState,
+    BattleStateStore,
+)
+from app.services.timers import round_timer, RoundTimer
+from app.services.users import ensure_user, known_users
 from app.ws import messenger, Messenger
+from app.ws.encoding import loads
+
+
+# serialized `battles_list` pages, invalidated on new offers and accepts
+offers_cache = TTLCache(ttl=settings.BATTLE_OFFERS_CACHE_TTL)
+
+
+def offer_battle_exists(offer_id: t.Any = m.BattleOffer.offer_id) -> t.Any:
+    """
+    The offer (correlated by default) already has a battle, e.g. offers of matched users
+    are created with their battle
+    """
+    return exists(
+        select(m.Battle.battle_id)
+            .join(m.BattleOfferAccept, m.BattleOfferAccept.accept_id == m.Battle.accept_id)
+            .where(m.BattleOfferAccept.offer_id == offer_id)
+    )  # noqa
+
+# session of the action processed in the current task, the service itself is shared
+_db_session: ContextVar[t.Optional[AsyncSession]] = ContextVar('battle_db_session', default=None)
 
 
 class BattleService:
-    db_session: AsyncSession
     messenger: Messenger
+    state_store: BattleStateStore
+    offers_cache: TTLCache
+    matchmaking: MatchmakingQueue
+    round_timer: RoundTimer
 
-    def __init__(self, db_session: AsyncSession = Depends(get_db_session)) -> None:
-        self.db_session = db_session
+    def __init__(self) -> None:
         self.messenger = messenger
+        self.state_store = battle_state_store
+        self.offers_cache = offers_cache
+        self.matchmaking = matchmaking_queue
+        self.round_timer = round_timer
 
     async def process_message(
         self,
-        message: t.Union[bytes, dict, str],
+        message: t.Union[bytes, dict, list, str],
         ws: WebSocket
     ) -> None:
         data = self._parse_message(message)
+
+        # short-lived unit of work: the session (and its pooled connection)
+        # lives only as long as the incoming action (or batch of actions)
+        async with DBSession() as db_session:
+            with self._use_db_session(db_session):
+                if isinstance(data, list):
+                    await self._process_batch(data, ws)
+                else:
+                    await self._process_data(data, ws)
+
+    @property
+    def db_session(self) -> t.Optional[AsyncSession]:
+        return _db_session.get()
+
+    @staticmethod
+    @contextmanager
+    def _use_db_session(db_session: AsyncSession) -> t.Iterator[None]:
+        token = _db_session.set(db_session)
+        try:
+            yield
+        finally:
+            _db_session.reset(token)
+
+    async def _process_data(self, data: t.Any, ws: WebSocket) -> None:
+        with metrics.track_action(self._action_label(data)):
+            await self._process_tracked_data(data, ws)
+
+    async def _process_tracked_data(self, data: t.Any, ws: WebSocket) -> None:
         ok: bool = False
 
         try:
-            incoming_message = s.IncomingMessage(**data)
-            await self._process_message(incoming_message, ws)
+            incoming_message = s.IncomingMessage.parse_obj(data)
+            with count_commits() as commits:
+                await self._process_message(incoming_message, ws)
+            commit_stats.observe(incoming_message.action, commits.count)
+            query_stats.observe(incoming_message.action, commits.queries)
             ok = True
         except ValidationError as e:
             logger.exception(e)
-            await ws.send_json({
+            metrics.set_error('validation')
+            await self.messenger.send_to_ws(ws, {
                 'error': 'validationError',
                 'payload': e.errors(),
             })
         except Exception as e:
             logger.exception(e)
-            await ws.send_json({
+            metrics.set_error('unexpected')
+            await self.messenger.send_to_ws(ws, {
                 'error': 'unexpectedError',
                 'payload': {
                     'message': str(e),
@@ -55,28 +127,77 @@ class BattleService:
             if not ok:
                 await self.db_session.rollback()
 
+    def _action_label(self, data: t.Any) -> str:
+        # metric label, unknown actions share one label
+        action = data.get('action', None) if isinstance(data, dict) else None
+        if isinstance(action, str) and hasattr(self, f'action_{action}'):
+            return action
+
+        return 'unknown'
+
+    async def _process_batch(self, items: list[t.Any], ws: WebSocket) -> None:
+        """
+        Process actions of a batch in order, in one session. Replies to the
+        sender, including its copies of messages sent to the battle users,
+        are collected and sent back in one frame, as `[{id, payload}]`.
+        """
+        if not 0 < len(items) <= settings.BATTLE_BATCH_MAX_SIZE:
+            return await self.messenger.send_to_ws(ws, {
+                'error': 'Invalid batch size',
+                'payload': {
+                    'maxSize': settings.BATTLE_BATCH_MAX_SIZE,
+                }
+            })
+
+        results = []
+        for item in items:
+            with self.messenger.collect(ws) as replies:
+                await self._process_data(item, ws)
+            results.append({
+                'id': item.get('id', None) if isinstance(item, dict) else None,
+                'payload': replies[0] if len(replies) == 1 else (replies or None),
+            })
+
+        await self.messenger.send_to_ws(ws, results)
+
     async def action_battles_create(self, user: dict, ws: WebSocket) -> None:
         user = s.BattleUser(**user)
-        db_user = await self._get_db_user(user.user_id)
+        await self._ensure_user(user.user_id)
         # create new offer
-        db_offer = m.BattleOffer(user=db_user)
+        db_offer = m.BattleOffer(user_id=user.user_id)
         self.db_session.add(db_offer)
         await self.db_session.commit()
+        known_users.add(user.user_id)
+        self.offers_cache.clear()
 
-        return await ws.send_json(
+        return await self.messenger.send_to_ws(
+            ws,
             s.BattleOffer.from_orm(db_offer).dict(by_alias=True)
         )
 
-    async def action_battles_list(self, _: t.Any, ws: WebSocket) -> None:
-        _stmt = select(m.BattleOffer).where(m.BattleOffer.is_active)
-        offers: list[m.BattleOffer] = (await self.db_session.execute(_stmt)).scalars().all()
-        if not offers:
-            return await ws.send_json([])
+    async def action_battles_list(self, params: t.Union[dict, list], ws: WebSocket) -> None:
+        params = s.BattleOffersList.parse_obj(params or {})
+        cache_key = (params.after_offer_id, params.limit)
+        if (offers := self.offers_cache.get(cache_key)) is not None:
+            return await self.messenger.send_to_ws(ws, offers, key='battles_list')
 
-        await ws.send_json([
+        # keyset pagination, ordered by offer id
+        _stmt = (
+            select(m.BattleOffer)
+                .where(m.BattleOffer.is_active, ~offer_battle_exists())
+                .order_by(m.BattleOffer.offer_id)
+                .limit(params.limit)
+        )  # noqa
+        if params.after_offer_id is not None:
+            _stmt = _stmt.where(m.BattleOffer.offer_id > params.after_offer_id)
+        db_offers: list[m.BattleOffer] = (await self.db_session.execute(_stmt)).scalars().all()
+        offers = [
             s.BattleOffer.from_orm(offer).dict(by_alias=True)
-            for offer in offers
-        ])
+            for offer in db_offers
+        ]
+        self.offers_cache.set(cache_key, offers)
+
+        await self.messenger.send_to_ws(ws, offers, key='battles_list')
 
     async def action_battles_accept(self, offer: dict, ws: WebSocket) -> None:
         offer = s.BattleOffer(**offer)
@@ -92,102 +213,213 @@ class BattleService:
             message = (
                 'Battle offer does not exist' if not db_offer else 'Invalid battle offer'
             )
-            return await ws.send_json({
+            return await self.messenger.send_to_ws(ws, {
                 'error': message,
                 'payload': {
                     'offerId': offer.offer_id,
                 }
             })
-        _stmt = (
-            select(m.BattleOfferAccept)
+        _accepted = exists(
+            select(m.BattleOfferAccept.accept_id)
                 .where(
                     m.BattleOfferAccept.offer_id == offer.offer_id,
                     m.BattleOfferAccept.user_id == offer.user_id
                 )
         )  # noqa
-        _accept: t.Optional[m.BattleOfferAccept] = (
-            (await self.db_session.execute(_stmt)).scalars().first()
-        )
-        if _accept:
-            return await ws.send_json({
+        _taken = offer_battle_exists(offer.offer_id)
+        accepted, taken = (await self.db_session.execute(select(_accepted, _taken))).one()
+        if taken:
+            return await self.messenger.send_to_ws(ws, {
+                'error': 'Battle has already been taken',
+                'payload': {
+                    'offerId': offer.offer_id,
+                }
+            })
+        if accepted:
+            return await self.messenger.send_to_ws(ws, {
                 'error': 'You already accepted this battle',
                 'payload': {
                     'offerId': offer.offer_id,
                 }
             })
 
-        db_user = await self._get_db_user(offer.user_id)
+        await self._ensure_user(offer.user_id)
         # create battle offer accept
-        accept = m.BattleOfferAccept(offer_id=db_offer.offer_id, user_id=db_user.user_id)
+        accept = m.BattleOfferAccept(offer_id=db_offer.offer_id, user_id=offer.user_id)
         self.db_session.add(accept)
         await self.db_session.commit()
+        known_users.add(offer.user_id)
+        self.offers_cache.clear()
 
-        return await ws.send_json(
+        return await self.messenger.send_to_ws(
+            ws,
             s.BattleOfferAccept.from_orm(accept).dict(by_alias=True)
         )
 
     async def action_battles_start(self, accept: dict, ws: WebSocket) -> None:
         accept = s.BattleOfferAccept(**accept)
-        # checks
-        db_accept: t.Optional[m.BattleOfferAccept] = (
-            await self.db_session.get(m.BattleOfferAccept, accept.accept_id)
-        )
-        if not db_accept:
-            return await ws.send_json({
-                'error': 'Battle offer accept does not exist',
+        # one round trip: the unique `accept_id` rejects a second start,
+        # users are taken from the accept and its offer
+        _stmt = (
+            insert(m.Battle)
+                .from_select(
+                    [
+                        m.Battle.accept_id,
+                        m.Battle.status,
+                        m.Battle.offer_creator_id,
+                        m.Battle.offer_acceptor_id,
+                        m.Battle.current_round,
+                        m.Battle.offer_creator_hp,
+                        m.Battle.offer_acceptor_hp,
+                    ],
+                    select(
+                        m.BattleOfferAccept.accept_id,
+                        literal(BattleStatus.ACTIVE, type_=m.Battle.status.type),
+                        m.BattleOffer.user_id,
+                        m.BattleOfferAccept.user_id,
+                        literal(0),
+                        literal(settings.BATTLE_USER_HP),
+                        literal(settings.BATTLE_USER_HP),
+                    )
+                        .join(m.BattleOffer, m.BattleOffer.offer_id == m.BattleOfferAccept.offer_id)
+                        .where(m.BattleOfferAccept.accept_id == accept.accept_id)
+                )
+                .on_conflict_do_nothing(index_elements=[m.Battle.accept_id])
+                .returning(m.Battle.battle_id, m.Battle.offer_creator_id, m.Battle.offer_acceptor_id)
+        )  # noqa
+        row = (await self.db_session.execute(_stmt)).first()
+        if row is None:
+            # checks, only for the failed start
+            db_accept: t.Optional[m.BattleOfferAccept] = (
+                await self.db_session.get(m.BattleOfferAccept, accept.accept_id)
+            )
+            return await self.messenger.send_to_ws(ws, {
+                'error': (
+                    'Battle offer accept does not exist'
+                    if not db_accept else
+                    'Battle has already been taken'
+                ),
                 'payload': {
                     'acceptId': accept.accept_id,
                 }
             })
-        _stmt = select(m.Battle).where(m.Battle.accept_id == db_accept.accept_id)
-        _battle: t.Optional[m.Battle] = (await self.db_session.execute(_stmt)).scalars().first()
-        if _battle:
-            return await ws.send_json({
-                'error': 'Battle has already been taken',
+        await self.db_session.commit()
+
+        battle = m.Battle(
+            battle_id=row.battle_id,
+            accept_id=accept.accept_id,
+            status=BattleStatus.ACTIVE,
+            offer_creator_id=row.offer_creator_id,
+            offer_acceptor_id=row.offer_acceptor_id,
+            current_round=0,
+            offer_creator_hp=settings.BATTLE_USER_HP,
+            offer_acceptor_hp=settings.BATTLE_USER_HP
+        )
+        state = self.state_store.add(BattleState.from_orm(battle))
+        self.round_timer.schedule(state.battle_id, state.current_round)
+
+        return await self.messenger.send_to_users(
+            [row.offer_creator_id, row.offer_acceptor_id,],
+            state.add_event(0, s.Battle.from_orm(battle).dict(by_alias=True))
+        )
+
+    async def action_battles_queue(self, params: dict, ws: WebSocket) -> None:
+        params = s.BattleQueue(**params)
+        if params.user_id in self.matchmaking:
+            return await self.messenger.send_to_ws(ws, {
+                'error': 'You are already in the queue',
                 'payload': {
-                    'acceptId': accept.accept_id,
+                    'userId': params.user_id,
                 }
             })
 
-        # get battle users
-        _creator_stmt = (
-            select(m.BattleUser)
-                .join(m.BattleOffer)
-                .where(m.BattleOffer.offer_id == db_accept.offer_id)
-        )  # noqa
-        offer_creator: m.BattleUser = (await self.db_session.execute(_creator_stmt)).scalars().first()
-        _acceptor_stmt = (
-            select(m.BattleUser)
-                .join(m.BattleOfferAccept)
-                .where(m.BattleOfferAccept.accept_id == db_accept.accept_id)
-        )  # noqa
-        offer_acceptor: m.BattleUser = (await self.db_session.execute(_acceptor_stmt)).scalars().first()
+        opponent: t.Optional[Ticket] = self.matchmaking.match(params.user_id, ws, params.rating)
+        if opponent is None:
+            # the battle is pushed when an opponent comes
+            return await self.messenger.send_to_ws(ws, params.dict(by_alias=True))
 
-        # create battle
+        try:
+            battle, state = await self._create_matched_battle(opponent.user_id, params.user_id)
+        except Exception:
+            self.matchmaking.requeue(opponent)
+            raise
+
+        return await self.messenger.send_to_users(
+            [opponent.user_id, params.user_id],
+            state.add_event(0, s.Battle.from_orm(battle).dict(by_alias=True))
+        )
+
+    async def _create_matched_battle(
+        self,
+        creator_id: int,
+        acceptor_id: int
+    ) -> tuple[m.Battle, BattleState]:
+        """
+        Create offer, accept and battle of matched users in one transaction
+        """
+        await self._ensure_user(creator_id)
+        await self._ensure_user(acceptor_id)
+        offer = m.BattleOffer(user_id=creator_id)
+        accept = m.BattleOfferAccept(offer=offer, user_id=acceptor_id)
         battle = m.Battle(
-            accept_id=db_accept.accept_id,
+            accept=accept,
             status=BattleStatus.ACTIVE,
-            log=self._get_battle_start_log(
-                offer_creator.user_id,
-                offer_acceptor.user_id
-            )
+            offer_creator_id=creator_id,
+            offer_acceptor_id=acceptor_id,
+            current_round=0,
+            offer_creator_hp=settings.BATTLE_USER_HP,
+            offer_acceptor_hp=settings.BATTLE_USER_HP
         )
-        self.db_session.add(battle)
+        self.db_session.add_all([offer, accept, battle])
         await self.db_session.commit()
+        known_users.add(creator_id)
+        known_users.add(acceptor_id)
+        self.offers_cache.clear()
+        state = self.state_store.add(BattleState.from_orm(battle))
+        self.round_timer.schedule(state.battle_id, state.current_round)
 
-        return await self.messenger.send_to_users(
-            [offer_creator.user_id, offer_acceptor.user_id,],
-            s.Battle.from_orm(battle).dict(by_alias=True)
-        )
+        return battle, state
+
+    async def action_battles_resume(self, params: dict, ws: WebSocket) -> None:
+        """
+        Messages missed since `lastSeq` (from memory), or a snapshot of the battle
+        if they are not buffered anymore
+        """
+        params = s.BattleResume(**params)
+        async with self.state_store.lock(params.battle_id):
+            battle: t.Optional[BattleState] = (
+                await self.state_store.get(params.battle_id, self.db_session)
+            )
+        if not battle or params.user_id not in battle.user_ids:
+            return await self.messenger.send_to_ws(ws, {
+                'error': 'Battle does not exist' if not battle else 'You have not access to battle',
+                'payload': {
+                    'battleId': params.battle_id,
+                }
+            })
+
+        missed = battle.events_since(-1 if params.last_seq is None else params.last_seq)
+        if missed is None:
+            return await self.messenger.send_to_ws(
+                ws,
+                self._generate_battle_snapshot(battle, params.user_id)
+            )
+
+        return await self.messenger.send_to_ws(ws, missed)
 
     async def action_battles_move(self, move: dict, ws: WebSocket) -> None:
         move = s.BattleMove(**move)
-        battle: t.Optional[m.Battle] = (
-            await self.db_session.get(m.Battle, move.battle_id)
+        # moves of one battle are handled one by one, in arrival order
+        async with self.state_store.lock(move.battle_id):
+            await self._battles_move(move, ws)
+
+    async def _battles_move(self, move: s.BattleMove, ws: WebSocket) -> None:
+        battle: t.Optional[BattleState] = (
+            await self.state_store.get(move.battle_id, self.db_session)
         )
         # checks
         if not battle:
-            return await ws.send_json({
+            return await self.messenger.send_to_ws(ws, {
                 'error': 'Battle does not exist',
                 'payload': {
                     'battleId': move.battle_id,
@@ -195,32 +427,76 @@ class BattleService:
             })
         ok, message = self._check_battle_move(battle, move)
         if not ok:
-            return await ws.send_json(message)
+            return await self.messenger.send_to_ws(ws, message)
 
-        # update battle round info
+        # update battle round info (in memory)
         self._add_battle_move(battle, move)
         if self._is_full_battle_round(battle):
             self._update_battle_round_winner(battle)
-            await self.db_session.commit()
-            user_ids, payload = self._generate_battle_round_info(battle)
-            # send information about the finished round to users
-            await self.messenger.send_to_users(user_ids, payload)
-            # check if the battle is over
-            self._update_battle_winner(battle)
-            await self.db_session.commit()
-            if battle.log['winner'] is not None:
-                user_ids, payload = self._generate_battle_info(battle)
-                # send information about the finished battle to users
-                await self.messenger.send_to_users(user_ids, payload)
+            await self._finish_battle_round(battle)
         else:
-            await self.db_session.commit()
+            await self.state_store.persist(battle)
+
+    async def expire_round(self, battle_id: int, battle_round: int) -> None:
+        """
+        Move deadline of the round has passed: the user who has not moved forfeits
+        the round, the battle is finished without a winner if nobody has moved
+        """
+        async with DBSession() as db_session:
+            with self._use_db_session(db_session):
+                async with self.state_store.lock(battle_id):
+                    await self._expire_round(battle_id, battle_round)
+
+    async def _expire_round(self, battle_id: int, battle_round: int) -> None:
+        battle: t.Optional[BattleState] = (
+            await self.state_store.get(battle_id, self.db_session)
+        )
+        # the round has been resolved in time
+        if not battle or not battle.is_active or battle.current_round != battle_round:
+            return
+
+        if not battle.current.answers:
+            battle.status = BattleStatus.FINISHED
+            await self.state_store.persist(battle)
+            await self._send_battle_info(battle)
+            return
+        if self._is_full_battle_round(battle):
+            # both users have moved, but the round was not resolved (e.g. legacy state)
+            self._update_battle_round_winner(battle)
+            await self._finish_battle_round(battle)
+            return
+
+        (user_id, _), = battle.current.answers
+        battle.current.round_winner = user_id
+        battle.current.round_damage = self._random_battle_round_damage()
+        battle.close_round()
+        await self._finish_battle_round(battle)
+
+    async def _finish_battle_round(self, battle: BattleState) -> None:
+        round_user_ids, round_payload = self._generate_battle_round_info(battle)
+        round_payload = battle.add_event(battle.current_round + 1, round_payload)
+        # check if the battle is over
+        self._update_battle_winner(battle)
+        await self.state_store.persist(battle)
+        # send information about the finished round to users
+        await self.messenger.send_to_users(round_user_ids, round_payload)
+        events.emit('round_resolved', battle_id=battle.battle_id, round_info=round_payload)
+        if battle.is_active:
+            self.round_timer.schedule(battle.battle_id, battle.current_round)
+        else:
+            await self._send_battle_info(battle)
+
+    async def _send_battle_info(self, battle: BattleState) -> None:
+        user_ids, payload = self._generate_battle_info(battle)
+        payload = battle.add_event(battle.last_seq, payload)
+        # send information about the finished battle to users
+        await self.messenger.send_to_users(user_ids, payload)
+        events.emit('battle_finished', battle_id=battle.battle_id, battle_info=payload)
 
     @staticmethod
     def _parse_message(message: t.Union[bytes, dict, str]) -> dict[str, t.Any]:
-        if isinstance(message, bytes):
-            return json.loads(message.decode('utf-8'))
-        if isinstance(message, str):
-            return json.loads(message)
+        if isinstance(message, (bytes, str)):
+            return loads(message)
 
         return message
 
@@ -231,7 +507,7 @@ class BattleService:
     ) -> None:
         handler = getattr(self, f'action_{incoming_message.action}', None)
         if handler is None:
-            return await ws.send_json({
+            return await self.messenger.send_to_ws(ws, {
                 'error': 'Unexpected action',
                 'payload': {
                     'action': incoming_message.action,
@@ -240,53 +516,20 @@ class BattleService:
 
         await handler(incoming_message.payload, ws)
 
-    async def _get_db_user(
-        self,
-        user_id: t.Optional[int] = None,
-        user: t.Optional[s.BattleUser] = None
-    ) -> m.BattleUser:
+    async def _ensure_user(self, user_id: int) -> None:
         """
-        Get or create db user instance
+        Users are provisioned at connect, only unknown ids (e.g. another user's) hit the db.
+        A new user is committed with the action.
         """
-        user_id = user_id or user.user_id
-        user: t.Optional[m.BattleUser] = await (
-            self.db_session.get(m.BattleUser, user_id)
-        )
-        if user is None:
-            user = m.BattleUser(user_id=user_id)
-            self.db_session.add(user)
-            await self.db_session.commit()
-
-        return user
-
-    @staticmethod
-    def _get_battle_start_log(
-        offer_creator_id: int,
-        offer_acceptor_id: int
-    ) -> dict[str, t.Any]:
-        return {
-            'users': {
-                'offer_creator': offer_creator_id,
-                'offer_acceptor': offer_acceptor_id,
-            },
-            'current_round': 0,
-            'rounds': {
-                0: {
-                    'answers': [],
-                    'round_winner': None,
-                    'round_damage': 0,
-                },
-            },
-            'winner': None,
-        }
+        await ensure_user(self.db_session, user_id)
 
     @staticmethod
     def _check_battle_move(
-        battle: m.Battle,
+        battle: BattleState,
         move: s.BattleMove
     ) -> tuple[bool, t.Optional[dict[str, t.Any]]]:
         # user permissions
-        if move.user_id not in battle.log['users'].values():
+        if move.user_id not in battle.user_ids:
             return False, {
                 'error': 'You have not access to battle',
                 'payload': {
@@ -294,7 +537,7 @@ class BattleService:
                 }
             }
         # battle status
-        if battle.status is not BattleStatus.ACTIVE:
+        if not battle.is_active:
             return False, {
                 'error': 'Battle is already over',
                 'payload': {
@@ -304,10 +547,7 @@ class BattleService:
         # round number
         if (
             move.round != battle.current_round
-            or any(
-                item['user_id'] == move.user_id
-                for item in battle.log['rounds'][str(battle.current_round)]['answers']
-            )
+            or battle.current.has_answer(move.user_id)
         ):
             return False, {
                 'error': 'Wrong battle round number',
@@ -319,153 +559,108 @@ class BattleService:
         return True, None
 
     @staticmethod
-    def _is_full_battle_round(battle: m.Battle) -> bool:
-        return len(battle.log['rounds'][str(battle.current_round)]['answers']) == 2
+    def _is_full_battle_round(battle: BattleState) -> bool:
+        return len(battle.current.answers) == 2
 
     @staticmethod
-    def _add_empty_battle_round(battle: m.Battle) -> None:
-        rounds = battle.log['rounds']
-        current_round = str(battle.current_round)
-        if current_round not in rounds:
-            rounds[current_round] = {
-                'answers': [],
-                'round_winner': None,
-            }
-        battle.log['rounds'] = rounds
-        flag_modified(battle, 'log')
-
-    def _add_battle_move(self, battle: m.Battle, move: s.BattleMove) -> None:
-        rounds = battle.log['rounds']
-        current_round = str(battle.current_round)
-        if current_round not in rounds:
-            self._add_empty_battle_round(battle)
-        rounds[current_round]['answers'].append({
-            'user_id': move.user_id,
-            'choice': move.choice.value,
-        })
-        battle.log['rounds'] = rounds
-        flag_modified(battle, 'log')
-
-    def _update_battle_round_winner(self, battle: m.Battle) -> None:
-        battle_round: dict[str, t.Union[list[dict[str, int]], int]] = (
-            battle.log['rounds'][str(battle.current_round)]
-        )
-        #TODO Refactoring
-        u1, u2 = battle_round['answers']
-        u1_choice, u2_choice = u1['choice'], u2['choice']
-        if u1_choice == u2_choice:
-            return
+    def _add_battle_move(battle: BattleState, move: s.BattleMove) -> None:
+        battle.add_answer(move.user_id, move.choice.value)
 
-        # find round winner
-        round_winner = None
-        if u1_choice == RockPaperScissorsChoice.ROCK:
-            if u2_choice == RockPaperScissorsChoice.PAPER:
-                round_winner = u2['user_id']
-            else:
-                round_winner = u1['user_id']
-        elif u1_choice == RockPaperScissorsChoice.PAPER:
-            if u2_choice == RockPaperScissorsChoice.ROCK:
-                round_winner = u1['user_id']
-            else:
-                round_winner = u2['user_id']
-        elif u1_choice == RockPaperScissorsChoice.SCISSORS:
-            if u2_choice == RockPaperScissorsChoice.ROCK:
-                round_winner = u2['user_id']
-            else:
-                round_winner = u1['user_id']
-
-        # update round winner
-        battle_round['round_winner'] = round_winner
-        battle_round['round_damage'] = self._random_battle_round_damage()
-        battle.log['rounds'][str(battle.current_round)] = battle_round
-        flag_modified(battle, 'log')
+    def _update_battle_round_winner(self, battle: BattleState) -> None:
+        battle_round = battle.current
+        round_winner = engine.round_winner(battle_round.answers)
+        if round_winner is not None:
+            battle_round.round_winner = round_winner
+            battle_round.round_damage = self._random_battle_round_damage()
+        battle.close_round()
 
     def _generate_battle_round_info(
         self,
-        battle: m.Battle
+        battle: BattleState
     ) -> tuple[t.Sequence[int], dict[str, t.Any]]:
-        #TODO Refactoring
-        battle_round: dict[str, t.Union[list[dict[str, int]], int]] = (
-            battle.log['rounds'][str(battle.current_round)]
-        )
-        user_ids = [
-            item['user_id']
-            for item in battle_round['answers']
-        ]
-        payload = self._get_battle_round_info(battle.current_round, battle_round)
+        # both users, also the one who forfeited the round
+        payload = self._get_battle_round_info(battle.current_round, battle.current)
 
-        return user_ids, payload
+        return list(battle.user_ids), payload
 
     @staticmethod
     def _get_battle_round_info(
-        round_id: t.Union[int, str],
-        battle_round: dict[str, t.Union[list[dict[str, int]], int]]
+        round_id: int,
+        battle_round: BattleRound
     ) -> dict[str, t.Any]:
         return {
-            'roundId': int(round_id),
+            'roundId': round_id,
             'roundWinner': {
-                'userId': battle_round['round_winner'],
+                'userId': battle_round.round_winner,
             },
-            'roundDamage': battle_round['round_damage'],
+            'roundDamage': battle_round.round_damage,
             'answers': [
                 {
-                    'userId': item['user_id'],
-                    'choice': item['choice'],
+                    'userId': user_id,
+                    'choice': choice,
                 }
-                for item in battle_round['answers']
+                for user_id, choice in battle_round.answers
             ],
         }
 
-    def _update_battle_winner(self, battle: m.Battle) -> None:
-        #TODO Refactoring
-        user_ids = list(battle.log['users'].values())
-        users = {
-            user_id: settings.BATTLE_USER_HP
-            for user_id in user_ids
-        }
-
-        battle_rounds: dict[str, dict[str, t.Union[list[dict[str, int]], int]]] = battle.log['rounds']
-        for battle_round in battle_rounds.values():
-            if battle_round['round_winner'] is None:
-                continue
-
-            user_id = user_ids[1] if battle_round['round_winner'] == user_ids[0] else user_ids[0]
-            # update user hp
-            users[user_id] -= battle_round['round_damage']
-
+    @staticmethod
+    def _update_battle_winner(battle: BattleState) -> None:
+        battle_round = battle.current
         battle_winner = None
-        for user_id, user_hp in users.items():
-            if user_hp <= 0:
-                battle_winner = user_ids[1] if user_id == user_ids[0] else user_ids[0]
-                break
+        if battle_round.round_winner is not None:
+            # update opponent hp, O(1) per round
+            opponent = battle.damage_opponent(battle_round.round_winner, battle_round.round_damage)
+            if battle.hp[opponent] <= 0:
+                battle_winner = battle_round.round_winner
 
         if battle_winner is not None:
-            battle.log['winner'] = {
-                'user_id': battle_winner,
-            }
-            self.status = BattleStatus.FINISHED
+            battle.winner = battle_winner
+            battle.status = BattleStatus.FINISHED
         else:
             # increase battle round counter
-            battle.log['current_round'] += 1
-            self._add_empty_battle_round(battle)
-
-        flag_modified(battle, 'log')
+            battle.current_round += 1
+            battle.rounds.append(BattleRound())
 
-    def _generate_battle_info(self, battle: m.Battle) -> tuple[t.Sequence[int], dict[str, t.Any]]:
-        #TODO Refactoring
-        user_ids = list(battle.log['users'].values())
-        rounds = []
-        for battle_round_id, battle_round in battle.log['rounds'].items():
-            rounds.append(self._get_battle_round_info(battle_round_id, battle_round))
+    def _generate_battle_info(self, battle: BattleState) -> tuple[t.Sequence[int], dict[str, t.Any]]:
+        rounds = [
+            self._get_battle_round_info(battle_round_id, battle_round)
+            for battle_round_id, battle_round in enumerate(battle.rounds)
+        ]
 
-        return user_ids, {
+        return list(battle.user_ids), {
             'winner': {
-                'userId': battle.log['winner']['user_id'],
+                'userId': battle.winner,
             },
             'roundCount': battle.current_round + 1,
             'rounds': rounds,
         }
 
+    def _generate_battle_snapshot(self, battle: BattleState, user_id: int) -> dict[str, t.Any]:
+        # resolved rounds only, a pending answer of the opponent is not revealed
+        rounds_count = battle.current_round if battle.is_active else battle.current_round + 1
+
+        return {
+            'battleId': battle.battle_id,
+            'seq': battle.last_seq,
+            'status': battle.status.value,
+            'currentRound': battle.current_round,
+            'moved': battle.is_active and battle.current.has_answer(user_id),
+            'hp': [
+                {
+                    'userId': battle_user_id,
+                    'hp': hp,
+                }
+                for battle_user_id, hp in zip(battle.user_ids, battle.hp)
+            ],
+            'winner': {
+                'userId': battle.winner,
+            },
+            'rounds': [
+                self._get_battle_round_info(battle_round_id, battle_round)
+                for battle_round_id, battle_round in enumerate(battle.rounds[:rounds_count])
+            ],
+        }
+
     @staticmethod
     def _random_battle_round_damage() -> int:
-        return randint(settings.BATTLE_USER_DAMAGE_MIN, settings.BATTLE_USER_DAMAGE_MAX)
+        return engine.round_damage()
@@ -0,0 +1,77 @@
+import typing as t
+from collections import OrderedDict
+
+from app.clock import clock
+
+
+class TTLCache:
+    """
+    Small in-memory cache, entries expire `ttl` seconds after they were set
+    """
+    _entries: dict[t.Hashable, tuple[float, t.Any]]
+    _ttl: float
+    _maxsize: int
+
+    def __init__(self, ttl: float, maxsize: int = 128) -> None:
+        self._entries = dict()
+        self._ttl = ttl
+        self._maxsize = maxsize
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: t.Hashable) -> t.Optional[t.Any]:
+        entry = self._entries.get(key, None)
+        if entry is None:
+            return None
+
+        expires, value = entry
+        if expires < clock.monotonic():
+            self._entries.pop(key, None)
+            return None
+
+        return value
+
+    def set(self, key: t.Hashable, value: t.Any) -> None:
+        if len(self._entries) >= self._maxsize and key not in self._entries:
+            # drop the oldest entry
+            self._entries.pop(next(iter(self._entries)))
+
+        self._entries[key] = (clock.monotonic() + self._ttl, value)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class LRUSet:
+    """
+    Bounded set, the least recently used item is dropped when it is full
+    """
+    _items: OrderedDict[t.Hashable, None]
+    _maxsize: int
+
+    def __init__(self, maxsize: int) -> None:
+        self._items = OrderedDict()
+        self._maxsize = maxsize
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, item: t.Hashable) -> bool:
+        if item not in self._items:
+            return False
+
+        self._items.move_to_end(item)
+        return True
+
+    def add(self, item: t.Hashable) -> None:
+        self._items[item] = None
+        self._items.move_to_end(item)
+        if len(self._items) > self._maxsize:
+            self._items.popitem(last=False)
+
+    def discard(self, item: t.Hashable) -> None:
+        self._items.pop(item, None)
+
+    def clear(self) -> None:
+        self._items.clear()
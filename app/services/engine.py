@@ -0,0 +1,111 @@
+import random
+import typing as t
+
+from app.clock import clock
+from app.config import settings
+from app.schemas.enum import RockPaperScissorsChoice
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+# pure battle rules, shared by live battles and offline simulation / replay
+DRAW: int = 0
+FIRST: int = 1  # the first answer wins
+SECOND: int = 2  # the second answer wins
+
+# OUTCOMES[first choice][second choice]
+OUTCOMES: tuple[tuple[int, ...], ...] = tuple(
+    tuple(
+        (DRAW, SECOND, FIRST)[(second - first) % len(RockPaperScissorsChoice)]
+        for second in range(len(RockPaperScissorsChoice))
+    )
+    for first in range(len(RockPaperScissorsChoice))
+)
+
+if np is not None:
+    _OUTCOMES_TABLE = np.array(OUTCOMES, dtype=np.int8)
+
+
+def round_outcome(first_choice: int, second_choice: int) -> int:
+    return OUTCOMES[first_choice][second_choice]
+
+
+def round_winner(answers: t.Sequence[tuple[int, int]]) -> t.Optional[int]:
+    """
+    Winner user id of a full round `[(user_id, choice), (user_id, choice)]`, None for a draw
+    """
+    (u1, u1_choice), (u2, u2_choice) = answers
+    outcome = OUTCOMES[u1_choice][u2_choice]
+    if outcome == DRAW:
+        return None
+
+    return u1 if outcome == FIRST else u2
+
+
+def round_damage(rng: t.Optional[random.Random] = None) -> int:
+    return (rng or clock.random).randint(settings.BATTLE_USER_DAMAGE_MIN, settings.BATTLE_USER_DAMAGE_MAX)
+
+
+def resolve_rounds(
+    first_choices: t.Sequence[int],
+    second_choices: t.Sequence[int],
+    seed: t.Optional[int] = None
+) -> tuple[t.Sequence[int], t.Sequence[int]]:
+    """
+    Resolve many rounds at once: outcomes and damage (0 for a draw) per round.
+    Uses numpy arrays if numpy is installed (`batch` extra), plain lists otherwise.
+    The two paths draw damage from different generators: the seed reproduces
+    the damage of one path only, not across installs with and without numpy.
+    """
+    if np is None:
+        rng = random.Random(seed)
+        outcomes = [
+            OUTCOMES[first][second]
+            for first, second in zip(first_choices, second_choices)
+        ]
+        damage = [
+            round_damage(rng) if outcome != DRAW else 0
+            for outcome in outcomes
+        ]
+        return outcomes, damage
+
+    first_choices = np.asarray(first_choices, dtype=np.intp)
+    second_choices = np.asarray(second_choices, dtype=np.intp)
+    outcomes = _OUTCOMES_TABLE[first_choices, second_choices]
+    damage = np.random.default_rng(seed).integers(
+        settings.BATTLE_USER_DAMAGE_MIN,
+        settings.BATTLE_USER_DAMAGE_MAX,
+        size=len(outcomes),
+        endpoint=True,
+        dtype=np.int32
+    )
+    damage[outcomes == DRAW] = 0
+
+    return outcomes, damage
+
+
+def replay_hp(
+    outcomes: t.Sequence[int],
+    damage: t.Sequence[int],
+    hp: int = settings.BATTLE_USER_HP
+) -> tuple[int, int]:
+    """
+    Hp of the first and the second user after the rounds
+    """
+    if np is None:
+        first_hp, second_hp = hp, hp
+        for outcome, points in zip(outcomes, damage):
+            if outcome == FIRST:
+                second_hp -= points
+            elif outcome == SECOND:
+                first_hp -= points
+        return first_hp, second_hp
+
+    outcomes, damage = np.asarray(outcomes), np.asarray(damage)
+    return (
+        hp - int(damage[outcomes == SECOND].sum()),
+        hp - int(damage[outcomes == FIRST].sum()),
+    )
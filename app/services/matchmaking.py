@@ -0,0 +1,119 @@
+import typing as t
+from collections import deque
+
+from fastapi import WebSocket
+
+from app.clock import clock
+from app.config import settings
+
+
+class Ticket:
+    __slots__ = ('user_id', 'ws', 'bucket', 'time_queued', 'cancelled')
+
+    user_id: int
+    ws: WebSocket
+    bucket: int
+    time_queued: float
+    cancelled: bool
+
+    def __init__(self, user_id: int, ws: WebSocket, bucket: int) -> None:
+        self.user_id = user_id
+        self.ws = ws
+        self.bucket = bucket
+        self.time_queued = clock.monotonic()
+        self.cancelled = False
+
+    def widening(self) -> int:
+        """
+        Number of neighbour rating buckets the ticket accepts an opponent from
+        """
+        if not settings.BATTLE_MATCHMAKING_WIDEN_INTERVAL:
+            return 0
+
+        waited = clock.monotonic() - self.time_queued
+        return min(
+            int(waited // settings.BATTLE_MATCHMAKING_WIDEN_INTERVAL),
+            settings.BATTLE_MATCHMAKING_MAX_WIDEN
+        )
+
+
+class MatchmakingQueue:
+    """
+    Users waiting for an opponent: a FIFO queue per rating bucket, the search
+    widens to neighbour buckets while a user waits. Pairing is O(1): at most
+    `2 * BATTLE_MATCHMAKING_MAX_WIDEN + 1` queue heads are checked.
+    """
+    _buckets: dict[int, deque[Ticket]]
+    _tickets: dict[int, Ticket]  # user_id -> queued ticket
+
+    def __init__(self) -> None:
+        self._buckets = dict()
+        self._tickets = dict()
+
+    def __len__(self) -> int:
+        return len(self._tickets)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._tickets
+
+    def match(self, user_id: int, ws: WebSocket, rating: t.Optional[int] = None) -> t.Optional[Ticket]:
+        """
+        Pop a waiting opponent for the user, or queue the user if there is none
+        """
+        bucket = (rating or 0) // settings.BATTLE_MATCHMAKING_BUCKET_SIZE
+        # the own bucket first, then neighbours, the closest first
+        for distance in range(settings.BATTLE_MATCHMAKING_MAX_WIDEN + 1):
+            for candidate in ((bucket - distance, bucket + distance) if distance else (bucket,)):
+                if (opponent := self._pop(candidate, distance)) is not None:
+                    return opponent
+
+        ticket = Ticket(user_id, ws, bucket)
+        self._tickets[user_id] = ticket
+        self._buckets.setdefault(bucket, deque()).append(ticket)
+
+        return None
+
+    def requeue(self, ticket: Ticket) -> None:
+        """
+        Put a popped ticket back to the head of its queue (e.g. the battle was not created)
+        """
+        if ticket.cancelled or ticket.user_id in self._tickets:
+            return
+
+        self._tickets[ticket.user_id] = ticket
+        self._buckets.setdefault(ticket.bucket, deque()).appendleft(ticket)
+
+    def discard(self, user_id: int, ws: t.Optional[WebSocket] = None) -> None:
+        """
+        Remove the user (queued from the websocket) from the queue
+        """
+        ticket = self._tickets.get(user_id, None)
+        if ticket is None or (ws is not None and ticket.ws is not ws):
+            return
+
+        # removed from its bucket lazily
+        ticket.cancelled = True
+        self._tickets.pop(user_id)
+
+    def _pop(self, bucket: int, distance: int) -> t.Optional[Ticket]:
+        queue = self._buckets.get(bucket, None)
+        while queue:
+            ticket = queue[0]
+            if ticket.cancelled:
+                queue.popleft()
+                continue
+            # the head waits the longest, so it has the widest search
+            if ticket.widening() < distance:
+                return None
+
+            queue.popleft()
+            self._tickets.pop(ticket.user_id, None)
+            return ticket
+
+        if queue is not None:
+            self._buckets.pop(bucket)
+
+        return None
+
+
+matchmaking_queue = MatchmakingQueue()
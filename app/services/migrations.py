@@ -0,0 +1,122 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import settings
+from app.db.base import DeclarativeBase
+from app.logging import logger
+
+
+# the log is dropped by the migration, a migrated schema has no `battle.log`
+_HAS_BATTLE_LOG = (
+    """
+    SELECT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'battle' AND column_name = 'log'
+    )
+    """
+)
+# JSONB `battle.log` -> scalar `battle` columns + `battle_round`/`battle_answer` rows
+_MIGRATE_BATTLE_LOG = (
+    """
+    ALTER TABLE battle
+        ADD COLUMN IF NOT EXISTS offer_creator_id BIGINT
+            REFERENCES battle_user (user_id) ON UPDATE CASCADE ON DELETE CASCADE,
+        ADD COLUMN IF NOT EXISTS offer_acceptor_id BIGINT
+            REFERENCES battle_user (user_id) ON UPDATE CASCADE ON DELETE CASCADE,
+        ADD COLUMN IF NOT EXISTS current_round INTEGER NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS offer_creator_hp INTEGER,
+        ADD COLUMN IF NOT EXISTS offer_acceptor_hp INTEGER,
+        ADD COLUMN IF NOT EXISTS winner_id BIGINT
+            REFERENCES battle_user (user_id) ON UPDATE CASCADE ON DELETE CASCADE,
+        ADD COLUMN IF NOT EXISTS time_finished TIMESTAMP
+    """,
+    """
+    INSERT INTO battle_answer (battle_id, round, user_id, choice, time_created)
+    SELECT b.battle_id, r.key::int, (a.value->>'user_id')::bigint, (a.value->>'choice')::smallint, b.time_created
+    FROM battle b
+        CROSS JOIN jsonb_each(b.log->'rounds') r
+        CROSS JOIN jsonb_array_elements(r.value->'answers') a
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    INSERT INTO battle_round (battle_id, round, round_winner_id, round_damage, time_created)
+    SELECT
+        b.battle_id,
+        r.key::int,
+        (r.value->>'round_winner')::bigint,
+        COALESCE((r.value->>'round_damage')::int, 0),
+        b.time_created
+    FROM battle b
+        CROSS JOIN jsonb_each(b.log->'rounds') r
+    WHERE jsonb_array_length(r.value->'answers') = 2
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    UPDATE battle b SET
+        offer_creator_id = (b.log->'users'->>'offer_creator')::bigint,
+        offer_acceptor_id = (b.log->'users'->>'offer_acceptor')::bigint,
+        current_round = (b.log->>'current_round')::int,
+        winner_id = (b.log->'winner'->>'user_id')::bigint,
+        offer_creator_hp = :hp - COALESCE((
+            SELECT sum(r.round_damage) FROM battle_round r
+            WHERE r.battle_id = b.battle_id
+                AND r.round_winner_id = (b.log->'users'->>'offer_acceptor')::bigint
+        ), 0),
+        offer_acceptor_hp = :hp - COALESCE((
+            SELECT sum(r.round_damage) FROM battle_round r
+            WHERE r.battle_id = b.battle_id
+                AND r.round_winner_id = (b.log->'users'->>'offer_creator')::bigint
+        ), 0)
+    """,
+    """
+    ALTER TABLE battle
+        ALTER COLUMN offer_creator_id SET NOT NULL,
+        ALTER COLUMN offer_acceptor_id SET NOT NULL,
+        ALTER COLUMN offer_creator_hp SET NOT NULL,
+        ALTER COLUMN offer_acceptor_hp SET NOT NULL,
+        DROP COLUMN log
+    """,
+)
+# idempotent, run on every migration
+_MIGRATE_BATTLES = (
+    # the legacy service never stored the FINISHED status, battles with a winner are over
+    """
+    UPDATE battle SET status = 'FINISHED'
+    WHERE winner_id IS NOT NULL AND status <> 'FINISHED'
+    """,
+    # the finish time of legacy battles is unknown, the creation time is the best bound
+    """
+    UPDATE battle SET time_finished = time_created
+    WHERE status = 'FINISHED' AND time_finished IS NULL
+    """,
+    # indexes of existing tables are not created by `create_all`
+    """
+    CREATE INDEX IF NOT EXISTS battle_offer_time_created_idx ON battle_offer (time_created)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS battle_time_finished_idx ON battle (time_finished)
+    """,
+)
+
+
+async def migrate_battle_log(db_uri: str, echo: bool = settings.BATTLE_DEBUG) -> None:
+    """
+    Move battle logs into normalized tables (single transaction).
+    Safe to re-run: logs are moved only while `battle.log` exists.
+    """
+    engine = create_async_engine(db_uri, echo=echo)
+    try:
+        async with engine.begin() as connection:
+            # create `battle_round`/`battle_answer`, existing tables are kept
+            await connection.run_sync(DeclarativeBase.metadata.create_all)
+            has_log: bool = await connection.scalar(text(_HAS_BATTLE_LOG))
+            statements = (_MIGRATE_BATTLE_LOG if has_log else ()) + _MIGRATE_BATTLES
+            for statement in statements:
+                await connection.execute(text(statement), {'hp': settings.BATTLE_USER_HP})
+    finally:
+        await engine.dispose()
+
+    if has_log:
+        logger.info('Battle logs migrated.')
+    else:
+        logger.info('Battle logs have already been migrated.')
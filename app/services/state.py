@@ -0,0 +1,484 @@
+import asyncio
+import typing as t
+from collections import deque
+from contextlib import asynccontextmanager
+
+from sqlalchemy import and_, bindparam, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+import app.db.models as m
+from app.clock import clock
+from app.config import settings
+from app.db.session import DBSession
+from app.logging import logger
+from app.schemas.enum import BattleStatus
+
+
+class BattleRound:
+    __slots__ = ('answers', 'round_winner', 'round_damage')
+
+    answers: list[tuple[int, int]]  # (user_id, choice)
+    round_winner: t.Optional[int]
+    round_damage: int
+
+    def __init__(
+        self,
+        answers: t.Optional[list[tuple[int, int]]] = None,
+        round_winner: t.Optional[int] = None,
+        round_damage: int = 0
+    ) -> None:
+        self.answers = answers or []
+        self.round_winner = round_winner
+        self.round_damage = round_damage
+
+    def has_answer(self, user_id: int) -> bool:
+        # a round has at most two answers
+        return any(answer[0] == user_id for answer in self.answers)
+
+
+class BattleState:
+    """
+    In-memory authoritative state of a battle
+    """
+    __slots__ = (
+        'battle_id',
+        'status',
+        'user_ids',
+        'current_round',
+        'rounds',
+        'hp',
+        'winner',
+        'pending_answers',
+        'pending_rounds',
+        'events',
+    )
+
+    battle_id: int
+    status: BattleStatus
+    user_ids: tuple[int, int]  # (offer creator, offer acceptor)
+    current_round: int
+    rounds: list[BattleRound]
+    hp: list[int]  # [offer creator, offer acceptor]
+    winner: t.Optional[int]
+    # not persisted yet: (round, user_id, choice) / (round, round_winner, round_damage)
+    pending_answers: list[tuple[int, int, int]]
+    pending_rounds: list[tuple[int, t.Optional[int], int]]
+    # recent broadcast messages, for reconnecting clients: (seq, message)
+    events: deque[tuple[int, dict[str, t.Any]]]
+
+    def __init__(
+        self,
+        battle_id: int,
+        status: BattleStatus,
+        user_ids: tuple[int, int],
+        current_round: int = 0,
+        rounds: t.Optional[list[BattleRound]] = None,
+        hp: t.Optional[list[int]] = None,
+        winner: t.Optional[int] = None
+    ) -> None:
+        self.battle_id = battle_id
+        self.status = status
+        self.user_ids = user_ids
+        self.current_round = current_round
+        self.rounds = rounds or [BattleRound()]
+        self.hp = hp or self.replay_hp(user_ids, self.rounds)
+        self.winner = winner
+        self.pending_answers = []
+        self.pending_rounds = []
+        self.events = deque(maxlen=settings.BATTLE_EVENTS_BUFFER_SIZE)
+
+    @classmethod
+    def from_orm(
+        cls,
+        battle: m.Battle,
+        answers: t.Iterable[tuple[m.BattleAnswer, t.Optional[m.BattleRound]]] = ()
+    ) -> 'BattleState':
+        """
+        Build state from the battle row and its answers (see `battle_answers_stmt`)
+        """
+        rounds = [BattleRound() for _ in range(battle.current_round + 1)]
+        for answer, battle_round in answers:
+            state_round = rounds[answer.round]
+            state_round.answers.append((answer.user_id, answer.choice))
+            if battle_round is not None:
+                state_round.round_winner = battle_round.round_winner_id
+                state_round.round_damage = battle_round.round_damage
+
+        return cls(
+            battle_id=battle.battle_id,
+            status=battle.status,
+            user_ids=(battle.offer_creator_id, battle.offer_acceptor_id),
+            current_round=battle.current_round,
+            rounds=rounds,
+            hp=[battle.offer_creator_hp, battle.offer_acceptor_hp],
+            winner=battle.winner_id
+        )
+
+    @staticmethod
+    def replay_hp(user_ids: tuple[int, int], rounds: t.Iterable[BattleRound]) -> list[int]:
+        """
+        Calculate users hp from scratch, O(rounds)
+        """
+        hp = [settings.BATTLE_USER_HP, settings.BATTLE_USER_HP]
+        for battle_round in rounds:
+            if battle_round.round_winner is None:
+                continue
+            hp[1 if battle_round.round_winner == user_ids[0] else 0] -= battle_round.round_damage
+
+        return hp
+
+    @property
+    def current(self) -> BattleRound:
+        return self.rounds[self.current_round]
+
+    @property
+    def is_active(self) -> bool:
+        return self.status is BattleStatus.ACTIVE
+
+    @property
+    def last_seq(self) -> int:
+        """
+        Sequence number of the last battle event, derived from the state:
+        0 - started, round + 1 - round resolved, round count + 1 - finished
+        """
+        if self.is_active:
+            return self.current_round
+
+        return self.current_round + 2
+
+    def add_event(self, seq: int, message: dict[str, t.Any]) -> dict[str, t.Any]:
+        """
+        Number the broadcast message and keep it in the ring buffer
+        """
+        message = {**message, 'seq': seq}
+        self.events.append((seq, message))
+
+        return message
+
+    def events_since(self, seq: int) -> t.Optional[list[dict[str, t.Any]]]:
+        """
+        Messages after the sequence number, None if the buffer has moved past it
+        """
+        if seq >= self.last_seq:
+            return []
+        if not self.events or self.events[0][0] > seq + 1:
+            return None
+
+        return [message for event_seq, message in self.events if event_seq > seq]
+
+    def add_answer(self, user_id: int, choice: int) -> None:
+        self.current.answers.append((user_id, choice))
+        self.pending_answers.append((self.current_round, user_id, choice))
+
+    def close_round(self) -> None:
+        """
+        Mark the current (resolved) round to be persisted
+        """
+        battle_round = self.current
+        self.pending_rounds.append(
+            (self.current_round, battle_round.round_winner, battle_round.round_damage)
+        )
+
+    def damage_opponent(self, user_id: int, damage: int) -> int:
+        """
+        Decrease hp of the opponent of the given user, returns opponent index
+        """
+        opponent = 1 if user_id == self.user_ids[0] else 0
+        self.hp[opponent] -= damage
+
+        return opponent
+
+
+def battle_answers_stmt() -> Select:
+    """
+    Answers of battles with their resolved rounds, served by primary key indexes
+    """
+    return (
+        select(m.BattleAnswer, m.BattleRound)
+            .outerjoin(
+                m.BattleRound,
+                and_(
+                    m.BattleRound.battle_id == m.BattleAnswer.battle_id,
+                    m.BattleRound.round == m.BattleAnswer.round
+                )
+            )
+            .order_by(
+                m.BattleAnswer.battle_id,
+                m.BattleAnswer.round,
+                m.BattleAnswer.time_created
+            )
+    )  # noqa
+
+
+class _KeyLock:
+    __slots__ = ('lock', 'users')
+
+    lock: asyncio.Lock
+    users: int
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class KeyedLocks:
+    """
+    Map of asyncio locks, a lock is evicted as soon as nobody holds or waits for it
+    """
+    _locks: dict[t.Hashable, _KeyLock]
+
+    def __init__(self) -> None:
+        self._locks = dict()
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def acquire(self, key: t.Hashable) -> t.AsyncIterator[None]:
+        if (key_lock := self._locks.get(key, None)) is None:
+            key_lock = self._locks[key] = _KeyLock()
+
+        key_lock.users += 1
+        try:
+            async with key_lock.lock:
+                yield
+        finally:
+            key_lock.users -= 1
+            if not key_lock.users:
+                self._locks.pop(key, None)
+
+
+class BattleStateStore:
+    """
+    Keeps active battles in memory and persists their changes to postgres
+    with a batched write-behind queue. The queue is flushed on a timer,
+    when it grows to `BATTLE_STATE_FLUSH_SIZE` and when a battle is finished.
+    """
+    _battles: dict[int, BattleState]
+    _dirty: dict[int, BattleState]
+    _locks: KeyedLocks
+    _flush_interval: float
+    _flush_size: int
+    _flush_lock: t.Optional[asyncio.Lock]
+    _wakeup: t.Optional[asyncio.Event]
+    _flusher: t.Optional[asyncio.Task]
+
+    def __init__(
+        self,
+        flush_interval: float = settings.BATTLE_STATE_FLUSH_INTERVAL,
+        flush_size: int = settings.BATTLE_STATE_FLUSH_SIZE
+    ) -> None:
+        self._battles = dict()
+        self._dirty = dict()
+        self._locks = KeyedLocks()
+        self._flush_interval = flush_interval
+        self._flush_size = flush_size
+        self._flush_lock = None
+        self._wakeup = None
+        self._flusher = None
+
+    def __len__(self) -> int:
+        return len(self._battles)
+
+    async def start(self) -> None:
+        # asyncio primitives must be created inside the running loop
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        await self.load_active()
+        self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+        self._battles.clear()
+
+    async def load_active(self) -> int:
+        """
+        Restore active battles from the database (e.g. after restart)
+        """
+        async with DBSession() as db_session:
+            _stmt = select(m.Battle).where(m.Battle.status == BattleStatus.ACTIVE)
+            battles: list[m.Battle] = (await db_session.execute(_stmt)).scalars().all()
+            _answers_stmt = (
+                battle_answers_stmt()
+                    .join(m.Battle, m.Battle.battle_id == m.BattleAnswer.battle_id)
+                    .where(m.Battle.status == BattleStatus.ACTIVE)
+            )  # noqa
+            answers = (await db_session.execute(_answers_stmt)).all()
+
+        battle_answers: dict[int, list[tuple[m.BattleAnswer, t.Optional[m.BattleRound]]]] = {}
+        for answer, battle_round in answers:
+            battle_answers.setdefault(answer.battle_id, []).append((answer, battle_round))
+        for battle in battles:
+            self._battles.setdefault(
+                battle.battle_id,
+                BattleState.from_orm(battle, battle_answers.get(battle.battle_id, ()))
+            )
+        logger.info('Loaded %d active battles.', len(battles))
+
+        return len(battles)
+
+    def active_rounds(self) -> list[tuple[int, int]]:
+        """
+        (battle_id, current round) of battles in memory
+        """
+        return [
+            (state.battle_id, state.current_round)
+            for state in self._battles.values()
+            if state.is_active
+        ]
+
+    def lock(self, battle_id: int) -> t.AsyncContextManager[None]:
+        """
+        Serialize actions of one battle, other battles are not blocked
+        """
+        return self._locks.acquire(battle_id)
+
+    def add(self, state: BattleState) -> BattleState:
+        return self._battles.setdefault(state.battle_id, state)
+
+    async def get(
+        self,
+        battle_id: int,
+        db_session: AsyncSession
+    ) -> t.Optional[BattleState]:
+        if state := self._battles.get(battle_id, None):
+            return state
+
+        battle: t.Optional[m.Battle] = await db_session.get(m.Battle, battle_id)
+        if battle is None:
+            return None
+        _stmt = battle_answers_stmt().where(m.BattleAnswer.battle_id == battle_id)
+        state = BattleState.from_orm(battle, (await db_session.execute(_stmt)).all())
+        if not state.is_active:
+            return state
+
+        return self.add(state)
+
+    async def persist(self, state: BattleState) -> None:
+        """
+        Schedule the battle state to be written to the database
+        """
+        self._dirty[state.battle_id] = state
+
+        if not state.is_active or self._flusher is None:
+            # finished battles (or no flusher) are written immediately
+            await self.flush()
+        elif len(self._dirty) >= self._flush_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        if not self._dirty:
+            return 0
+
+        if self._flush_lock is None:
+            return await self._flush()
+        async with self._flush_lock:
+            return await self._flush()
+
+    async def _flush(self) -> int:
+        states, self._dirty = list(self._dirty.values()), dict()
+        if not states:
+            return 0
+
+        # snapshot pending rows, they are removed from states only after commit
+        pending = [
+            (state, len(state.pending_answers), len(state.pending_rounds))
+            for state in states
+        ]
+        answers = [
+            {
+                'battle_id': state.battle_id,
+                'round': battle_round,
+                'user_id': user_id,
+                'choice': choice,
+            }
+            for state, answers_count, _ in pending
+            for battle_round, user_id, choice in state.pending_answers[:answers_count]
+        ]
+        rounds = [
+            {
+                'battle_id': state.battle_id,
+                'round': battle_round,
+                'round_winner_id': round_winner,
+                'round_damage': round_damage,
+            }
+            for state, _, rounds_count in pending
+            for battle_round, round_winner, round_damage in state.pending_rounds[:rounds_count]
+        ]
+        battles = [
+            {
+                '_battle_id': state.battle_id,
+                '_status': state.status,
+                '_current_round': state.current_round,
+                '_offer_creator_hp': state.hp[0],
+                '_offer_acceptor_hp': state.hp[1],
+                '_winner_id': state.winner,
+                '_time_finished': None if state.is_active else clock.utcnow(),
+            }
+            for state in states
+        ]
+
+        battle_table = m.Battle.__table__
+        _battle_stmt = (
+            update(battle_table)
+                .where(battle_table.c.battle_id == bindparam('_battle_id'))
+                .values(
+                    status=bindparam('_status'),
+                    current_round=bindparam('_current_round'),
+                    offer_creator_hp=bindparam('_offer_creator_hp'),
+                    offer_acceptor_hp=bindparam('_offer_acceptor_hp'),
+                    winner_id=bindparam('_winner_id'),
+                    time_finished=bindparam('_time_finished')
+                )
+        )  # noqa
+        try:
+            async with DBSession() as db_session:
+                # rows are append-only, conflicts mean a retried flush
+                if answers:
+                    await db_session.execute(
+                        insert(m.BattleAnswer.__table__).on_conflict_do_nothing(),
+                        answers
+                    )
+                if rounds:
+                    await db_session.execute(
+                        insert(m.BattleRound.__table__).on_conflict_do_nothing(),
+                        rounds
+                    )
+                await db_session.execute(_battle_stmt, battles)
+                await db_session.commit()
+        except Exception:  # noqa
+            logger.error('Failed to flush %d battles, retrying later.', len(states))
+            # requeue states, newer changes take precedence
+            for state in states:
+                self._dirty.setdefault(state.battle_id, state)
+            return 0
+
+        for state, answers_count, rounds_count in pending:
+            del state.pending_answers[:answers_count]
+            del state.pending_rounds[:rounds_count]
+            # finished battles are not needed in memory anymore
+            if not state.is_active:
+                self._battles.pop(state.battle_id, None)
+
+        return len(states)
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+
+battle_state_store = BattleStateStore()
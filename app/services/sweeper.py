@@ -0,0 +1,140 @@
+import asyncio
+import typing as t
+from datetime import timedelta
+
+from sqlalchemy import and_, delete, exists, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import app.db.models as m
+from app.clock import clock
+from app.config import settings
+from app.db.session import DBSession
+from app.logging import logger
+from app.schemas.enum import BattleStatus
+
+
+async def delete_finished_battles(
+    db_session: AsyncSession,
+    retention: int = settings.BATTLE_RETENTION,
+    batch_size: int = settings.BATTLE_SWEEP_BATCH_SIZE
+) -> int:
+    """
+    Delete battles finished more than `retention` seconds ago (with rounds and answers).
+    Battles without the finish time (legacy rows) are aged by the creation time.
+    """
+    bound = clock.utcnow() - timedelta(seconds=retention)
+    _ids = (
+        select(m.Battle.battle_id)
+            .where(
+                m.Battle.status == BattleStatus.FINISHED,
+                or_(
+                    m.Battle.time_finished < bound,
+                    and_(m.Battle.time_finished.is_(None), m.Battle.time_created < bound)
+                )
+            )
+            .limit(batch_size)
+    )  # noqa
+    _stmt = (
+        delete(m.Battle)
+            .where(m.Battle.battle_id.in_(_ids.scalar_subquery()))
+            .execution_options(synchronize_session=False)
+    )  # noqa
+
+    return await _delete_in_batches(db_session, _stmt, batch_size)
+
+
+async def delete_expired_offers(
+    db_session: AsyncSession,
+    retention: int = settings.BATTLE_OFFER_RETENTION,
+    batch_size: int = settings.BATTLE_SWEEP_BATCH_SIZE
+) -> int:
+    """
+    Delete offers (with accepts) expired more than `retention` seconds ago.
+    Offers are kept while they still have a battle.
+    """
+    bound = clock.utcnow() - timedelta(seconds=settings.BATTLE_OFFER_EXPIRES + retention)
+    _battles = (
+        select(m.Battle.battle_id)
+            .join(m.BattleOfferAccept, m.BattleOfferAccept.accept_id == m.Battle.accept_id)
+            .where(m.BattleOfferAccept.offer_id == m.BattleOffer.offer_id)
+    )  # noqa
+    _ids = (
+        select(m.BattleOffer.offer_id)
+            .where(
+                m.BattleOffer.time_created < bound,
+                ~exists(_battles)
+            )
+            .limit(batch_size)
+    )  # noqa
+    _stmt = (
+        delete(m.BattleOffer)
+            .where(m.BattleOffer.offer_id.in_(_ids.scalar_subquery()))
+            .execution_options(synchronize_session=False)
+    )  # noqa
+
+    return await _delete_in_batches(db_session, _stmt, batch_size)
+
+
+async def sweep(
+    db_session: AsyncSession,
+    battle_retention: int = settings.BATTLE_RETENTION,
+    offer_retention: int = settings.BATTLE_OFFER_RETENTION,
+    batch_size: int = settings.BATTLE_SWEEP_BATCH_SIZE
+) -> dict[str, int]:
+    # battles first, their offers can be deleted in the same run
+    battles = await delete_finished_battles(db_session, battle_retention, batch_size)
+    offers = await delete_expired_offers(db_session, offer_retention, batch_size)
+
+    return {
+        'battles': battles,
+        'offers': offers,
+    }
+
+
+async def _delete_in_batches(db_session: AsyncSession, stmt: t.Any, batch_size: int) -> int:
+    deleted: int = 0
+    while True:
+        result = await db_session.execute(stmt)
+        await db_session.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+
+
+class Sweeper:
+    """
+    Background task which deletes expired offers and old finished battles
+    """
+    _interval: int
+    _task: t.Optional[asyncio.Task]
+
+    def __init__(self, interval: int = settings.BATTLE_SWEEP_INTERVAL) -> None:
+        self._interval = interval
+        self._task = None
+
+    async def start(self) -> None:
+        if self._interval > 0:
+            self._task = asyncio.create_task(self._sweep_periodically())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _sweep_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                async with DBSession() as db_session:
+                    processed = await sweep(db_session)
+                logger.info('Sweeper processed rows: %s', processed)
+            except Exception:  # noqa
+                # logged by DBSession, try again on the next run
+                pass
+
+
+sweeper = Sweeper()
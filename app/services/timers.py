@@ -0,0 +1,151 @@
+import asyncio
+import typing as t
+from collections import deque
+
+from app.clock import clock
+from app.config import settings
+from app.logging import logger
+
+
+class RoundTimer:
+    """
+    Move deadlines of all active battle rounds, driven by one background task.
+    Every round gets the same timeout, so deadlines are scheduled in expiry order
+    and a FIFO queue is enough: O(1) to schedule a round and to pop an expired one.
+    Rounds resolved in time are not removed, their entries are skipped on expiry.
+    Failed expiries are retried after a fixed delay, from their own FIFO queue.
+    """
+    _timeout: float
+    _retry_delay: float
+    _deadlines: deque[tuple[float, int, int]]  # (deadline, battle_id, round)
+    _retries: deque[tuple[float, int, int]]
+    _on_expire: t.Optional[t.Callable[[int, int], t.Awaitable[None]]]
+    _wakeup: t.Optional[asyncio.Event]
+    _task: t.Optional[asyncio.Task]
+    _expired: int
+
+    def __init__(
+        self,
+        timeout: float = settings.BATTLE_ROUND_TIMEOUT,
+        retry_delay: float = settings.BATTLE_ROUND_RETRY_DELAY
+    ) -> None:
+        self._timeout = timeout
+        self._retry_delay = retry_delay
+        self._deadlines = deque()
+        self._retries = deque()
+        self._on_expire = None
+        self._wakeup = None
+        self._task = None
+        self._expired = 0
+
+    def __len__(self) -> int:
+        return len(self._deadlines) + len(self._retries)
+
+    async def start(
+        self,
+        on_expire: t.Callable[[int, int], t.Awaitable[None]],
+        rounds: t.Iterable[tuple[int, int]] = ()
+    ) -> None:
+        """
+        Run `on_expire(battle_id, round)` for rounds not resolved in time,
+        `rounds` (battle_id, round) are already running (e.g. restored after restart)
+        """
+        self._on_expire = on_expire
+        if self._timeout <= 0:
+            return
+
+        # asyncio primitives must be created inside the running loop
+        self._wakeup = asyncio.Event()
+        for battle_id, battle_round in rounds:
+            self.schedule(battle_id, battle_round)
+        self._task = asyncio.create_task(self._expire_periodically())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._deadlines.clear()
+        self._retries.clear()
+        self._on_expire = None
+
+    def schedule(self, battle_id: int, battle_round: int) -> None:
+        """
+        Start the move deadline of the battle round
+        """
+        if self._timeout <= 0 or self._on_expire is None:
+            return
+
+        self._add(self._deadlines, self._timeout, battle_id, battle_round)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'deadlines': len(self._deadlines),
+            'retries': len(self._retries),
+            'expired': self._expired,
+        }
+
+    async def expire(self) -> int:
+        """
+        Handle all rounds past their deadline, returns their number.
+        Rounds whose expiry failed are retried after `retry_delay`.
+        """
+        now = clock.monotonic()
+        expired: list[tuple[int, int]] = []
+        for queue in (self._retries, self._deadlines):
+            while queue and queue[0][0] <= now:
+                _, battle_id, battle_round = queue.popleft()
+                expired.append((battle_id, battle_round))
+        if not expired or self._on_expire is None:
+            return 0
+
+        self._expired += len(expired)
+        results = await asyncio.gather(
+            *(self._on_expire(battle_id, battle_round) for battle_id, battle_round in expired),
+            return_exceptions=True
+        )
+        for (battle_id, battle_round), result in zip(expired, results):
+            if isinstance(result, Exception):
+                logger.error(
+                    'Failed to expire round %s of battle %s, retrying: %r',
+                    battle_round, battle_id, result
+                )
+                self._add(self._retries, self._retry_delay, battle_id, battle_round)
+
+        return len(expired)
+
+    def _add(
+        self,
+        queue: deque[tuple[float, int, int]],
+        delay: float,
+        battle_id: int,
+        battle_round: int
+    ) -> None:
+        # both queues get entries with a constant delay, so each stays sorted;
+        # retries are added by `expire`, the task recomputes its sleep after it
+        queue.append((clock.monotonic() + delay, battle_id, battle_round))
+        if len(self) == 1 and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _next_deadline(self) -> float:
+        return min(queue[0][0] for queue in (self._deadlines, self._retries) if queue)
+
+    async def _expire_periodically(self) -> None:
+        while True:
+            if not len(self):
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            delay = self._next_deadline() - clock.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            await self.expire()
+
+
+round_timer = RoundTimer()
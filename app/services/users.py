@@ -0,0 +1,34 @@
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import app.db.models as m
+from app.config import settings
+from app.services.cache import LRUSet
+
+
+# ids of users which are known to exist in the db
+known_users = LRUSet(maxsize=settings.BATTLE_KNOWN_USERS_CACHE_SIZE)
+
+
+async def ensure_user(db_session: AsyncSession, user_id: int) -> bool:
+    """
+    Insert the user if it may not exist, in the current transaction.
+    Returns False if the user is already known (no query).
+    """
+    if user_id in known_users:
+        return False
+
+    # concurrent first requests of a user don't race on the primary key
+    _stmt = insert(m.BattleUser).values(user_id=user_id).on_conflict_do_nothing()
+    await db_session.execute(_stmt)
+
+    return True
+
+
+async def provision_user(db_session: AsyncSession, user_id: int) -> None:
+    """
+    Make sure the user exists, once per connection
+    """
+    if await ensure_user(db_session, user_id):
+        await db_session.commit()
+        known_users.add(user_id)
@@ -1,3 +1,20 @@
+from app.ws.backends import (
+    BroadcastBackend,
+    LocalBackend,
+)
+from app.ws.codecs import (
+    binary_codec,
+    BinaryCodec,
+    Codec,
+    json_codec,
+    JsonCodec,
+    negotiate_codec,
+)
+from app.ws.connection import (
+    Connection,
+    OverflowPolicy,
+    QueueStats,
+)
 from app.ws.messenger import (
     Messenger,
     messenger,
@@ -0,0 +1,36 @@
+import typing as t
+
+
+# (user ids, encoded message)
+DeliverCallback = t.Callable[[t.Sequence[int], str], t.Awaitable[None]]
+
+
+class BroadcastBackend:
+    """
+    Transport of messages to users. The server is a single process: battles, round
+    timers and matchmaking live in its memory, so only local delivery exists.
+    """
+    _deliver: t.Optional[DeliverCallback]
+
+    def __init__(self) -> None:
+        self._deliver = None
+
+    def bind(self, deliver: DeliverCallback) -> None:
+        self._deliver = deliver
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, user_ids: t.Sequence[int], data: str) -> None:
+        raise NotImplementedError
+
+
+class LocalBackend(BroadcastBackend):
+    """
+    Single process: messages are delivered right away
+    """
+    async def publish(self, user_ids: t.Sequence[int], data: str) -> None:
+        await self._deliver(user_ids, data)
@@ -0,0 +1,131 @@
+import struct
+import typing as t
+
+from app.ws.encoding import dumps, loads
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+class Codec:
+    """
+    Wire format of a websocket connection
+    """
+    subprotocol: t.Optional[str] = None
+
+    def encode(self, message: t.Any) -> t.Union[bytes, str]:
+        raise NotImplementedError
+
+    def decode(self, data: t.Union[bytes, str]) -> t.Any:
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    """
+    Default protocol, json text frames
+    """
+    def encode(self, message: t.Any) -> str:
+        return dumps(message)
+
+    def decode(self, data: t.Union[bytes, str]) -> t.Any:
+        return loads(data)
+
+
+class BinaryCodec(Codec):
+    """
+    Compact binary frames, the first byte is a frame tag:
+    - MOVE: `battles_move` action, fixed struct layout
+    - ROUND: finished round info, fixed struct layout
+    - MSGPACK: any other message packed with MessagePack
+    """
+    subprotocol = 'rps.binary.v1'
+
+    MSGPACK: int = 0
+    MOVE: int = 1
+    ROUND: int = 2
+
+    # tag, battle id, user id, round, choice
+    _move = struct.Struct('!BQQIB')
+    # tag, seq, round id, has winner (0 - draw), round winner, round damage, (user id, choice) x 2
+    _round = struct.Struct('!BIIBQHQBQB')
+    _round_keys = frozenset(('seq', 'roundId', 'roundWinner', 'roundDamage', 'answers'))
+
+    def encode(self, message: t.Any) -> bytes:
+        if self._is_round_info(message):
+            (u1, u2) = message['answers']
+            round_winner = message['roundWinner']['userId']
+            return self._round.pack(
+                self.ROUND,
+                message['seq'],
+                message['roundId'],
+                round_winner is not None,
+                round_winner or 0,
+                message['roundDamage'],
+                u1['userId'],
+                u1['choice'],
+                u2['userId'],
+                u2['choice']
+            )
+
+        return bytes((self.MSGPACK,)) + msgpack.packb(message)
+
+    def decode(self, data: t.Union[bytes, str]) -> t.Any:
+        if isinstance(data, str):
+            raise ValueError('Text frames are not supported by the binary protocol')
+
+        tag = data[0]
+        if tag == self.MOVE:
+            _, battle_id, user_id, battle_round, choice = self._move.unpack(data)
+            return {
+                'action': 'battles_move',
+                'payload': {
+                    'battleId': battle_id,
+                    'userId': user_id,
+                    'round': battle_round,
+                    'choice': choice,
+                },
+            }
+        if tag == self.ROUND:
+            _, seq, round_id, has_winner, round_winner, round_damage, u1, c1, u2, c2 = self._round.unpack(data)
+            return {
+                'seq': seq,
+                'roundId': round_id,
+                'roundWinner': {
+                    'userId': round_winner if has_winner else None,
+                },
+                'roundDamage': round_damage,
+                'answers': [
+                    {'userId': u1, 'choice': c1},
+                    {'userId': u2, 'choice': c2},
+                ],
+            }
+        if tag == self.MSGPACK:
+            return msgpack.unpackb(data[1:])
+
+        raise ValueError(f'Unknown frame tag: {tag}')
+
+    def encode_move(self, battle_id: int, user_id: int, battle_round: int, choice: int) -> bytes:
+        return self._move.pack(self.MOVE, battle_id, user_id, battle_round, choice)
+
+    def _is_round_info(self, message: t.Any) -> bool:
+        return (
+            isinstance(message, dict)
+            and message.keys() == self._round_keys
+            and len(message['answers']) == 2
+        )
+
+
+json_codec = JsonCodec()
+binary_codec = BinaryCodec()
+
+
+def negotiate_codec(subprotocols: t.Sequence[str]) -> Codec:
+    """
+    Pick the codec for subprotocols requested by the client, json by default
+    """
+    if msgpack is not None and binary_codec.subprotocol in subprotocols:
+        return binary_codec
+
+    return json_codec
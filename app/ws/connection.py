@@ -0,0 +1,193 @@
+import asyncio
+import enum
+import typing as t
+from collections import deque
+
+from fastapi import status, WebSocket
+from starlette.websockets import WebSocketState
+
+from app.config import settings
+from app.events import events
+from app.logging import logger
+from app.ws.codecs import Codec, json_codec
+
+
+@enum.unique
+class OverflowPolicy(str, enum.Enum):
+    DROP_OLDEST = 'drop_oldest'  # drop the oldest queued message
+    COALESCE = 'coalesce'  # replace a queued message with the same key, else drop the oldest
+    DISCONNECT = 'disconnect'  # evict the slow consumer
+
+
+class QueueStats:
+    __slots__ = ('dropped', 'evictions', 'send_errors')
+
+    dropped: int
+    evictions: int
+    send_errors: int
+
+    def __init__(self) -> None:
+        self.dropped = 0
+        self.evictions = 0
+        self.send_errors = 0
+
+
+class Connection:
+    """
+    Websocket with a bounded outbound queue drained by its own writer task,
+    so senders never wait for the client network
+    """
+    __slots__ = (
+        'user_id',
+        'ws',
+        'codec',
+        '_stats',
+        '_queue',
+        '_maxsize',
+        '_policy',
+        '_ready',
+        '_idle',
+        '_writer',
+        '_closer',
+        '_closed',
+        '_on_close',
+    )
+
+    user_id: int
+    ws: WebSocket
+    codec: Codec
+    _stats: QueueStats
+    _queue: deque[tuple[t.Optional[str], t.Union[bytes, str]]]  # (coalesce key, data)
+    _maxsize: int
+    _policy: OverflowPolicy
+    _ready: asyncio.Event
+    _idle: asyncio.Event
+    _writer: asyncio.Task
+    _closer: t.Optional[asyncio.Task]  # closes the websocket of an evicted connection
+    _closed: bool
+    _on_close: t.Callable[['Connection'], None]
+
+    def __init__(
+        self,
+        user_id: int,
+        ws: WebSocket,
+        stats: QueueStats,
+        on_close: t.Callable[['Connection'], None],
+        codec: Codec = json_codec,
+        maxsize: int = settings.BATTLE_WS_QUEUE_SIZE,
+        policy: OverflowPolicy = OverflowPolicy(settings.BATTLE_WS_QUEUE_POLICY)
+    ) -> None:
+        self.user_id = user_id
+        self.ws = ws
+        self.codec = codec
+        self._stats = stats
+        self._queue = deque()
+        self._maxsize = maxsize
+        self._policy = policy
+        self._ready = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._closer = None
+        self._closed = False
+        self._on_close = on_close
+        self._writer = asyncio.create_task(self._write())
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def put(self, data: t.Union[bytes, str], key: t.Optional[str] = None) -> bool:
+        """
+        Queue encoded message, returns False if the message (or connection) was dropped
+        """
+        if self._closed:
+            return False
+
+        if len(self._queue) >= self._maxsize:
+            if self._policy is OverflowPolicy.DISCONNECT:
+                self._stats.evictions += 1
+                self.close(code=status.WS_1013_TRY_AGAIN_LATER)
+                return False
+            if not (self._policy is OverflowPolicy.COALESCE and self._coalesce(key)):
+                self._queue.popleft()
+            self._stats.dropped += 1
+
+        self._queue.append((key, data))
+        self._idle.clear()
+        self._ready.set()
+
+        return True
+
+    async def wait_idle(self) -> None:
+        """
+        Wait until all queued messages are sent
+        """
+        await self._idle.wait()
+
+    def close(self, code: t.Optional[int] = None) -> None:
+        if self._closed:
+            return
+
+        self._closed = True
+        self._queue.clear()
+        self._idle.set()
+        self._writer.cancel()
+        self._on_close(self)
+        if code is not None and self.ws.application_state == WebSocketState.CONNECTED:
+            # keep a reference, the loop holds tasks weakly
+            self._closer = asyncio.create_task(self._close_ws(code))
+
+    async def wait_closed(self) -> None:
+        """
+        Wait until the writer task (and the websocket close) of the closed connection is finished
+        """
+        try:
+            await self._writer
+        except asyncio.CancelledError:
+            pass
+        if self._closer is not None:
+            await self._closer
+
+    def _coalesce(self, key: t.Optional[str]) -> bool:
+        if key is None:
+            return False
+
+        for item in self._queue:
+            if item[0] == key:
+                self._queue.remove(item)
+                return True
+
+        return False
+
+    async def _close_ws(self, code: int) -> None:
+        try:
+            await self.ws.close(code=code)
+        except RuntimeError:
+            pass
+
+    async def _write(self) -> None:
+        while True:
+            if not self._queue:
+                self._idle.set()
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            _, data = self._queue.popleft()
+            try:
+                if self.ws.application_state != WebSocketState.CONNECTED:
+                    raise RuntimeError('Websocket is not connected')
+                if isinstance(data, bytes):
+                    await self.ws.send_bytes(data)
+                else:
+                    await self.ws.send_text(data)
+            except Exception as e:
+                logger.warning('Failed to send message. user_id - %s: %s', self.user_id, e)
+                self._stats.send_errors += 1
+                self.close()
+                return
+
+            events.emit('message_delivered', user_id=self.user_id, ws=self.ws, data=data)
@@ -0,0 +1,24 @@
+import json
+import typing as t
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def dumps(message: t.Any) -> str:
+    """
+    Encode message to json text, with orjson when it is installed (`fastjson` extra)
+    """
+    if orjson is not None:
+        return orjson.dumps(message).decode('utf-8')
+
+    return json.dumps(message, ensure_ascii=False, separators=(',', ':'))
+
+
+def loads(data: t.Union[bytes, str]) -> t.Any:
+    if orjson is not None:
+        return orjson.loads(data)
+
+    return json.loads(data)
@@ -1,56 +1,183 @@
 import asyncio
+import time
 import typing as t
+from contextlib import contextmanager
+from contextvars import ContextVar
 
 from fastapi import WebSocket
 from starlette.websockets import WebSocketState
 
+import app.metrics as metrics
 from app.logging import logger
+from app.ws.backends import BroadcastBackend, LocalBackend
+from app.ws.codecs import Codec, json_codec
+from app.ws.connection import Connection, QueueStats
+from app.ws.encoding import dumps, loads
 
 
 class Messenger:
-    _websockets: dict[int, set[WebSocket]]
+    _connections: dict[WebSocket, Connection]
+    _users: dict[int, set[Connection]]
+    _stats: QueueStats
+    _backend: BroadcastBackend
+    _collector: ContextVar[t.Optional[tuple[WebSocket, list[t.Any]]]]
 
-    def __init__(self):
-        self._websockets = dict()
+    def __init__(self, backend: t.Optional[BroadcastBackend] = None):
+        self._collector = ContextVar('messenger_collector', default=None)
+        self._connections = dict()
+        self._users = dict()
+        self._stats = QueueStats()
+        self._backend = backend or LocalBackend()
+        self._backend.bind(self.deliver)
 
-    def connect(self, user_id: int, ws: WebSocket) -> None:
-        if user_id not in self._websockets:
-            self._websockets[user_id] = set()
+    async def start(self) -> None:
+        await self._backend.start()
 
-        self._websockets[user_id].add(ws)
+    async def stop(self) -> None:
+        await self._backend.stop()
+
+    def connect(self, user_id: int, ws: WebSocket, codec: Codec = json_codec) -> None:
+        connection = Connection(user_id, ws, self._stats, on_close=self._remove, codec=codec)
+        self._connections[ws] = connection
+
+        if user_id not in self._users:
+            self._users[user_id] = set()
+
+        self._users[user_id].add(connection)
 
     def disconnect(self, user_id: int, ws: WebSocket) -> None:
-        if user_id not in self._websockets:
-            logger.error(f'Remove not existing ws. user_id - {user_id}')
+        connection = self._connections.get(ws, None)
+        if connection is None:
+            if user_id not in self._users:
+                logger.error('Remove not existing ws. user_id - %s', user_id)
             return
 
-        self._websockets[user_id].discard(ws)
-
-        if not self._websockets[user_id]:
-            self._websockets.pop(user_id)
+        connection.close()
+
+    async def disconnect_all(self) -> None:
+        """
+        Close all connections of this process and wait for their writer tasks
+        """
+        connections = list(self._connections.values())
+        for connection in connections:
+            connection.close()
+        await asyncio.gather(*(connection.wait_closed() for connection in connections))
+
+    def stats(self) -> dict[str, int]:
+        depths = [len(connection) for connection in self._connections.values()]
+        return {
+            'connections': len(self._connections),
+            'users': len(self._users),
+            'queue_depth': sum(depths),
+            'queue_depth_max': max(depths, default=0),
+            'dropped': self._stats.dropped,
+            'evictions': self._stats.evictions,
+            'send_errors': self._stats.send_errors,
+        }
 
     async def send_to_users(
         self,
         user_ids: t.Sequence[int],
         message: dict[str, t.Any]
     ) -> None:
-        websockets = []
+        """
+        Send message to all websockets of users.
+        The message is encoded once for all recipients.
+        """
+        started = time.perf_counter()
+        await self._backend.publish(user_ids, dumps(message))
+        metrics.add_send_time(time.perf_counter() - started)
+
+    async def deliver(self, user_ids: t.Sequence[int], data: str) -> None:
+        """
+        Queue encoded message to websockets of users connected to this process.
+        Connections with another codec get the message re-encoded once per codec.
+        A websocket collecting replies (see `collect`) gets its copy collected too,
+        so it is not sent ahead of the replies.
+        """
+        sent: int = 0
+        frames: dict[Codec, t.Union[bytes, str]] = {json_codec: data}
+        message: t.Any = None
+        collector = self._collector.get()
 
         for user_id in user_ids:
-            if ws := self._websockets.get(user_id, None):
-                websockets.extend(ws)
+            # a snapshot: an evicted connection is removed from the set by `put`
+            for connection in tuple(self._users.get(user_id, ())):
+                if collector is not None and collector[0] is connection.ws:
+                    if message is None:
+                        message = loads(data)
+                    collector[1].append(message)
+                    continue
+                if (frame := frames.get(connection.codec, None)) is None:
+                    if message is None:
+                        message = loads(data)
+                    frame = frames[connection.codec] = connection.codec.encode(message)
+                sent += connection.put(frame)
+
+        if sent:
+            logger.debug('Message %s queued to %d connections.', data, sent)
+
+    async def send_to_ws(
+        self,
+        ws: WebSocket,
+        message: t.Union[dict[str, t.Any], list[t.Any]],
+        key: t.Optional[str] = None
+    ) -> None:
+        """
+        Queue message to the websocket, after messages already queued to it.
+        Messages with the same `key` may be coalesced.
+        """
+        if isinstance(message, dict) and 'error' in message:
+            # validation / unexpected errors are marked by the service
+            metrics.set_error('domain', override=False)
+
+        if (collector := self._collector.get()) is not None and collector[0] is ws:
+            collector[1].append(message)
+            return
 
-        if websockets:
-            await asyncio.gather(*(self.send_to_ws(ws, message) for ws in websockets))
-            logger.debug(f'Message {message} sent to {len(websockets)} connections.')
+        # an idle connection has an empty queue (len 0), so no truthiness check
+        if (connection := self._connections.get(ws, None)) is not None:
+            started = time.perf_counter()
+            connection.put(connection.codec.encode(message), key)
+            metrics.add_send_time(time.perf_counter() - started)
+            return
 
-    @staticmethod
-    async def send_to_ws(ws: WebSocket, message: dict[str, t.Any]) -> None:
+        data = dumps(message)
+        # not managed websocket
         try:
             if ws.application_state == WebSocketState.CONNECTED:
-                await ws.send_json(message)
+                await ws.send_text(data)
         except RuntimeError:
             pass
 
+    @contextmanager
+    def collect(self, ws: WebSocket) -> t.Iterator[list[t.Any]]:
+        """
+        Collect messages sent to the websocket (in the current context) instead of sending them
+        """
+        replies: list[t.Any] = []
+        token = self._collector.set((ws, replies))
+        try:
+            yield replies
+        finally:
+            self._collector.reset(token)
+
+    async def drain(self) -> None:
+        """
+        Wait until all queued messages are sent
+        """
+        await asyncio.gather(*(
+            connection.wait_idle()
+            for connection in list(self._connections.values())
+        ))
+
+    def _remove(self, connection: Connection) -> None:
+        self._connections.pop(connection.ws, None)
+
+        if connections := self._users.get(connection.user_id, None):
+            connections.discard(connection)
+            if not connections:
+                self._users.pop(connection.user_id)
+
 
 messenger = Messenger()
@@ -0,0 +1,7 @@
+import pytest
+
+
+def pytest_collection_modifyitems(items: list[pytest.Item]) -> None:
+    for item in items:
+        if 'tests/bench' in item.nodeid:
+            item.add_marker(pytest.mark.bench)
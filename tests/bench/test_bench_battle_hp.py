@@ -0,0 +1,51 @@
+import pytest
+
+from app.schemas.enum import BattleStatus
+from app.services import BattleService, BattleState
+from app.services.state import BattleRound
+
+pytestmark = pytest.mark.no_db
+
+
+def _make_battle(rounds: int) -> BattleState:
+    john, jack = 1, 2
+    battle_rounds = [
+        BattleRound(
+            answers=[(john, 0), (jack, 0 if i % 2 else 2)],
+            round_winner=None if i % 2 else john,
+            round_damage=0
+        )
+        for i in range(rounds)
+    ]
+    battle_rounds.append(BattleRound(answers=[(john, 0), (jack, 2)], round_winner=john, round_damage=1))
+
+    return BattleState(
+        battle_id=1,
+        status=BattleStatus.ACTIVE,
+        user_ids=(john, jack),
+        current_round=rounds,
+        rounds=battle_rounds
+    )
+
+
+@pytest.mark.parametrize('rounds', [10, 100, 1000])
+def test_bench_update_battle_winner(benchmark, rounds):
+    def setup():
+        return (_make_battle(rounds),), {}
+
+    benchmark.pedantic(BattleService._update_battle_winner, setup=setup, rounds=1000)  # noqa
+
+
+@pytest.mark.parametrize('rounds', [10, 100, 1000])
+def test_bench_replay_battle_hp(benchmark, rounds):
+    battle = _make_battle(rounds)
+
+    # the previous per-move cost: replaying every round
+    benchmark(BattleState.replay_hp, battle.user_ids, battle.rounds)
+
+
+@pytest.mark.parametrize('rounds', [10, 100, 1000, 10000])
+def test_bench_generate_battle_info(benchmark, rounds):
+    battle = _make_battle(rounds)
+
+    benchmark(BattleService()._generate_battle_info, battle)  # noqa
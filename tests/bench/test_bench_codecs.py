@@ -0,0 +1,60 @@
+import pytest
+
+from app.ws import binary_codec, json_codec
+
+pytest.importorskip('msgpack')
+
+pytestmark = pytest.mark.no_db
+
+
+MOVE = {
+    'action': 'battles_move',
+    'payload': {
+        'battleId': 123456,
+        'userId': 1001,
+        'round': 7,
+        'choice': 2,
+    },
+}
+ROUND_INFO = {
+    'seq': 8,
+    'roundId': 7,
+    'roundWinner': {
+        'userId': 1001,
+    },
+    'roundDamage': 12,
+    'answers': [
+        {'userId': 1001, 'choice': 2},
+        {'userId': 1002, 'choice': 1},
+    ],
+}
+CODECS = {
+    'json': json_codec,
+    'binary': binary_codec,
+}
+
+
+def _encoded_move(codec) -> bytes:
+    if codec is binary_codec:
+        payload = MOVE['payload']
+        return codec.encode_move(payload['battleId'], payload['userId'], payload['round'], payload['choice'])
+
+    return codec.encode(MOVE).encode()
+
+
+@pytest.mark.parametrize('codec', CODECS)
+def test_bench_decode_move(benchmark, codec):
+    codec = CODECS[codec]
+    data = _encoded_move(codec)
+    benchmark.extra_info['bytes'] = len(data)
+
+    assert benchmark(codec.decode, data) == MOVE
+
+
+@pytest.mark.parametrize('codec', CODECS)
+def test_bench_encode_round_info(benchmark, codec):
+    codec = CODECS[codec]
+    data = benchmark(codec.encode, ROUND_INFO)
+    benchmark.extra_info['bytes'] = len(data)
+
+    assert codec.decode(data) == ROUND_INFO
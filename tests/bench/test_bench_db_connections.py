@@ -0,0 +1,60 @@
+from contextlib import ExitStack
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import settings
+from app.db import get_db_pool_stats
+
+
+async def _count_db_connections() -> int:
+    engine = create_async_engine(settings.SQLALCHEMY_DATABASE_URL)
+    try:
+        async with engine.connect() as connection:
+            _stmt = text(
+                'SELECT count(*) FROM pg_stat_activity '
+                'WHERE datname = :db_name AND pid <> pg_backend_pid()'
+            )
+            return (await connection.execute(_stmt, {'db_name': settings.DB_NAME})).scalar()
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.parametrize('sockets', [10, 100, 500])
+async def test_idle_sockets_do_not_hold_connections(client, sockets):
+    with ExitStack() as stack:
+        connections = []
+        for user_id in range(1, sockets + 1):
+            ws = stack.enter_context(
+                client.websocket_connect(
+                    '/',
+                    headers={settings.BATTLE_USERNAME_HEADER: str(user_id)}
+                )
+            )
+            ws.send_json({
+                'action': 'battles_create',
+                'payload': {
+                    'userId': user_id,
+                }
+            })
+            connections.append(ws)
+
+        for ws in connections:
+            ws.receive_json()
+
+        # all sockets are open and idle now
+        pool_stats = get_db_pool_stats()
+        db_connections = await _count_db_connections()
+        print(
+            f'\nidle sockets: {sockets}, '
+            f'checked out: {pool_stats["checked_out"]}, '
+            f'overflow: {pool_stats["overflow"]}, '
+            f'waits: {pool_stats["waits"]}, '
+            f'postgres backends: {db_connections}'
+        )
+
+        assert pool_stats['checked_out'] == 0, pool_stats
+        assert db_connections <= settings.DB_POOL_SIZE + settings.DB_POOL_MAX_OVERFLOW, (
+            db_connections
+        )
@@ -0,0 +1,22 @@
+import random
+
+import pytest
+
+from app.services import engine
+
+pytestmark = pytest.mark.no_db
+
+
+@pytest.mark.parametrize('rounds', [10 ** 3, 10 ** 6])
+def test_bench_resolve_rounds(benchmark, rounds):
+    rng = random.Random(0)
+    first = [rng.randrange(3) for _ in range(rounds)]
+    second = [rng.randrange(3) for _ in range(rounds)]
+    if engine.np is not None:
+        first, second = engine.np.array(first), engine.np.array(second)
+
+    def replay():
+        outcomes, damage = engine.resolve_rounds(first, second, seed=0)
+        return engine.replay_hp(outcomes, damage)
+
+    benchmark(replay)
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from starlette.websockets import WebSocketState
+
+from app.ws import LocalBackend, Messenger
+
+pytestmark = pytest.mark.no_db
+
+
+class _WebSocket:
+    application_state = WebSocketState.CONNECTED
+
+    async def send_text(self, data: str) -> None:
+        pass
+
+
+def _battle_info(rounds: int) -> dict:
+    return {
+        'winner': {
+            'userId': 1,
+        },
+        'roundCount': rounds,
+        'rounds': [
+            {
+                'roundId': i,
+                'roundWinner': {
+                    'userId': 1,
+                },
+                'roundDamage': 10,
+                'answers': [
+                    {'userId': 1, 'choice': 0},
+                    {'userId': 2, 'choice': 2},
+                ],
+            }
+            for i in range(rounds)
+        ],
+    }
+
+
+@pytest.mark.parametrize('rounds', [1, 100, 1000])
+@pytest.mark.parametrize('recipients', [2, 20, 200])
+def test_bench_send_to_users(benchmark, rounds, recipients):
+    messenger = Messenger(LocalBackend())
+    user_ids = list(range(1, recipients + 1))
+    message = _battle_info(rounds)
+
+    async def connect():
+        for user_id in user_ids:
+            messenger.connect(user_id, _WebSocket())  # noqa
+
+    async def send():
+        await messenger.send_to_users(user_ids, message)
+        await messenger.drain()
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(connect())
+        benchmark(lambda: loop.run_until_complete(send()))
+    finally:
+        # writer tasks must not outlive the loop
+        loop.run_until_complete(messenger.disconnect_all())
+        loop.close()
@@ -0,0 +1,24 @@
+import pytest
+
+import app.schemas as s
+
+pytestmark = pytest.mark.no_db
+
+
+MOVE = {
+    'action': 'battles_move',
+    'payload': {
+        'battleId': 123456,
+        'userId': 1001,
+        'round': 7,
+        'choice': 2,
+    },
+}
+
+
+def test_bench_incoming_message(benchmark):
+    benchmark(s.IncomingMessage.parse_obj, MOVE)
+
+
+def test_bench_battle_move(benchmark):
+    benchmark(s.BattleMove.parse_obj, MOVE['payload'])
@@ -0,0 +1,127 @@
+import typing as t
+
+import pytest
+from starlette.websockets import WebSocketState
+
+from app.services import BattleService
+from app.services.battle import offers_cache
+from app.ws import messenger
+from app.ws.encoding import dumps, loads
+
+
+class _WebSocket:
+    application_state = WebSocketState.CONNECTED
+
+    def __init__(self) -> None:
+        self.messages: list[t.Any] = []
+
+    async def send_text(self, data: str) -> None:
+        self.messages.append(loads(data))
+
+
+class _User:
+    """
+    Websocket connected to the app messenger, calls `process_message` in the app loop
+    """
+    def __init__(self, client, user_id: int) -> None:
+        self.portal = client.portal
+        self.user_id = user_id
+        self.ws = _WebSocket()
+        self.portal.call(self._connect)
+
+    def send(self, action: str, payload: dict[str, t.Any]) -> t.Any:
+        """
+        Process the action, returns the last received message
+        """
+        self.portal.call(self._process, dumps({'action': action, 'payload': payload}))
+        return self.ws.messages[-1]
+
+    async def _connect(self) -> None:
+        messenger.connect(self.user_id, self.ws)  # noqa
+
+    async def _process(self, message: str) -> None:
+        await BattleService().process_message(message, self.ws)  # noqa
+        await messenger.drain()
+
+
+@pytest.fixture
+def users(client) -> t.Iterator[tuple[_User, _User]]:
+    yield _User(client, 1), _User(client, 2)
+    # writers of connections left in the global messenger would block the next benchmark
+    client.portal.call(messenger.disconnect_all)
+
+
+def _create(john: _User) -> int:
+    return john.send('battles_create', {'userId': john.user_id})['offerId']
+
+
+def _accept(jack: _User, offer_id: int) -> int:
+    return jack.send('battles_accept', {'userId': jack.user_id, 'offerId': offer_id})['acceptId']
+
+
+def _start(jack: _User, offer_id: int, accept_id: int) -> int:
+    return jack.send('battles_start', {'acceptId': accept_id, 'offerId': offer_id})['battleId']
+
+
+def test_bench_battles_create(benchmark, users):
+    john, _ = users
+    benchmark(_create, john)
+
+
+@pytest.mark.parametrize('cached', [True, False])
+@pytest.mark.parametrize('offers', [10, 1000])
+def test_bench_battles_list(benchmark, users, offers, cached):
+    john, jack = users
+    for _ in range(offers):
+        _create(john)
+
+    def setup():
+        if not cached:
+            offers_cache.clear()
+        return (jack, 'battles_list', {}), {}
+
+    benchmark.pedantic(_User.send, setup=setup, rounds=500)
+
+
+def test_bench_battles_accept(benchmark, users):
+    john, jack = users
+
+    def setup():
+        return (jack, _create(john)), {}
+
+    benchmark.pedantic(_accept, setup=setup, rounds=200)
+
+
+def test_bench_battles_start(benchmark, users):
+    john, jack = users
+
+    def setup():
+        offer_id = _create(john)
+        return (jack, offer_id, _accept(jack, offer_id)), {}
+
+    benchmark.pedantic(_start, setup=setup, rounds=200)
+
+
+def test_bench_battles_move(benchmark, users):
+    john, jack = users
+    offer_id = _create(john)
+    battle_id = _start(jack, offer_id, _accept(jack, offer_id))
+    battle_round = -1
+
+    def move(user: _User) -> t.Any:
+        # both users always choose rock, the battle never ends
+        return user.send('battles_move', {
+            'userId': user.user_id,
+            'battleId': battle_id,
+            'round': battle_round,
+            'choice': 0,
+        })
+
+    def setup():
+        nonlocal battle_round
+        battle_round += 1
+        move(john)
+        return (jack,), {}
+
+    # the second move of a round: resolve, persist and broadcast the round
+    benchmark.pedantic(move, setup=setup, rounds=500)
@@ -1,18 +1,78 @@
 import pytest
 from fastapi.testclient import TestClient
 
+from app.clock import clock as app_clock
 from app.config import settings
-from app.db import recreate_db_schema
+from app.db import commit_stats, query_stats, recreate_db_schema
 from app.main import app
+from app.services import known_users
 
 
 @pytest.fixture
 def client():
-    return TestClient(app)
+    commit_stats.reset()
+    # the db is recreated for every test
+    known_users.clear()
+    query_stats.reset()
+    # run app startup/shutdown and share one event loop between all websockets
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def clock():
+    """
+    Frozen app time and seeded RNG
+    """
+    app_clock.freeze()
+    app_clock.seed(0)
+    yield app_clock
+    app_clock.reset()
 
 
 @pytest.fixture(autouse=True)
-async def setup():
+async def setup(request):
+    # tests marked `no_db` don't need the database
+    if request.node.get_closest_marker('no_db') is not None:
+        yield
+        return
+
     await recreate_db_schema(settings.SQLALCHEMY_DATABASE_URL, echo=False)
     yield
     await recreate_db_schema(settings.SQLALCHEMY_DATABASE_URL, echo=False)
+
+
+@pytest.fixture
+def start_battle(client):
+    """
+    Returns a callable which runs create -> accept -> start for two connected users
+    """
+    def _start_battle(creator_ws, creator_id: int, acceptor_ws, acceptor_id: int) -> int:
+        creator_ws.send_json({
+            'action': 'battles_create',
+            'payload': {
+                'userId': creator_id,
+            }
+        })
+        offer_id = creator_ws.receive_json()['offerId']
+        acceptor_ws.send_json({
+            'action': 'battles_accept',
+            'payload': {
+                'userId': acceptor_id,
+                'offerId': offer_id,
+            }
+        })
+        accept_id = acceptor_ws.receive_json()['acceptId']
+        acceptor_ws.send_json({
+            'action': 'battles_start',
+            'payload': {
+                'acceptId': accept_id,
+                'offerId': offer_id,
+            }
+        })
+        battle = creator_ws.receive_json()
+        assert acceptor_ws.receive_json() == battle
+
+        return battle['battleId']
+
+    return _start_battle
@@ -1,15 +1,29 @@
+import random
 import typing as t
-from time import sleep
 
 from app.config import settings
+from app.db import commit_stats, query_stats
+from app.events import events
 
 
-def test_battle(client):
+def _expected_round_count() -> int:
+    # the clock fixture seeds the RNG with 0, John wins every round
+    rng = random.Random(0)
+    hp, rounds = settings.BATTLE_USER_HP, 0
+    while hp > 0:
+        hp -= rng.randint(settings.BATTLE_USER_DAMAGE_MIN, settings.BATTLE_USER_DAMAGE_MAX)
+        rounds += 1
+
+    return rounds
+
+
+def test_battle(client, clock):
     # user ids
     john = 1
     jack = 2
 
-    with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(john)}) as john_ws:
+    with events.record('round_resolved') as resolved, \
+            client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(john)}) as john_ws:
         with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(jack)}) as jack_ws:
             # create offer
             payload = {
@@ -83,7 +97,6 @@ def test_battle(client):
                     }
                 }
                 john_ws.send_json(payload)
-                sleep(0.75)  # TODO
 
                 # Jack is moving
                 payload = {
@@ -96,7 +109,6 @@ def test_battle(client):
                     }
                 }
                 jack_ws.send_json(payload)
-                sleep(0.75)  # TODO
 
                 # get round info
                 john_round: dict[str, t.Any] = john_ws.receive_json()
@@ -112,3 +124,49 @@ def test_battle(client):
             assert battle_result is not None, battle_round
             assert battle_result['winner']['userId'] == john, battle_result
             assert battle_result['roundCount'] == battle_round, (battle_round, battle_result,)
+            # the seeded RNG makes the battle deterministic
+            assert battle_round == _expected_round_count(), battle_result
+            assert [
+                {key: value for key, value in event['round_info'].items() if key != 'seq'}
+                for event in resolved
+            ] == battle_result['rounds']
+
+    # every action is one transaction, moves are written behind
+    assert commit_stats.max('battles_create') == 1
+    assert commit_stats.max('battles_list') == 0
+    assert commit_stats.max('battles_accept') == 1
+    assert commit_stats.max('battles_start') == 1
+    assert commit_stats.max('battles_move') <= 1
+    # queries per action, users are provisioned at connect
+    assert query_stats.max('battles_create') == 1
+    assert query_stats.max('battles_list') <= 1
+    assert query_stats.max('battles_accept') == 3
+    assert query_stats.max('battles_start') == 1
+    # rounds are written behind, only the last move flushes answers, rounds and the battle
+    assert query_stats.max('battles_move') <= 3
+
+
+def test_battle_start_twice(client, start_battle):
+    john, jack = 1, 2
+
+    with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(john)}) as john_ws:
+        with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(jack)}) as jack_ws:
+            start_battle(john_ws, john, jack_ws, jack)
+            query_stats.reset()
+
+            for accept_id, error in (
+                (1, 'Battle has already been taken'),
+                (100, 'Battle offer accept does not exist'),
+            ):
+                jack_ws.send_json({
+                    'action': 'battles_start',
+                    'payload': {
+                        'acceptId': accept_id,
+                        'offerId': 1,
+                    }
+                })
+                message = jack_ws.receive_json()
+                assert message['error'] == error, message
+
+    # the failed insert and the check of the accept
+    assert query_stats.max('battles_start') == 2
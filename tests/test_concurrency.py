@@ -0,0 +1,86 @@
+import asyncio
+import json
+import random
+import typing as t
+
+from starlette.websockets import WebSocketState
+
+from app.schemas.enum import BattleStatus
+from app.services import BattleService, BattleState, BattleStateStore
+from app.ws import messenger
+
+
+class _WebSocket:
+    application_state = WebSocketState.CONNECTED
+
+    def __init__(self) -> None:
+        self.messages: list[dict[str, t.Any]] = []
+
+    async def send_json(self, message: dict[str, t.Any]) -> None:
+        await asyncio.sleep(0)
+        self.messages.append(message)
+
+    async def send_text(self, data: str) -> None:
+        await self.send_json(json.loads(data))
+
+
+class _MemoryStateStore(BattleStateStore):
+    async def get(self, battle_id, db_session):
+        # yield to other moves, as a database read would
+        await asyncio.sleep(0)
+        return self._battles.get(battle_id, None)
+
+    async def _flush(self) -> int:
+        states, self._dirty = list(self._dirty.values()), dict()
+        for state in states:
+            state.pending_answers.clear()
+            state.pending_rounds.clear()
+
+        return len(states)
+
+
+async def test_concurrent_paired_moves():
+    battles, rounds = 1000, 3
+    service = BattleService()
+    service.state_store = store = _MemoryStateStore()
+
+    sockets: dict[int, _WebSocket] = {}
+    for battle_id in range(1, battles + 1):
+        user_ids = (battle_id * 2 - 1, battle_id * 2)
+        store.add(BattleState(battle_id=battle_id, status=BattleStatus.ACTIVE, user_ids=user_ids))
+        for user_id in user_ids:
+            sockets[user_id] = _WebSocket()
+            messenger.connect(user_id, sockets[user_id])
+
+    def move(user_id: int, battle_round: int) -> str:
+        return json.dumps({
+            'action': 'battles_move',
+            'payload': {
+                'userId': user_id,
+                'battleId': (user_id + 1) // 2,
+                'round': battle_round,
+                'choice': 0,  # draw, battles never finish
+            }
+        })
+
+    try:
+        for battle_round in range(rounds):
+            moves = [
+                service.process_message(move(user_id, battle_round), ws)
+                for user_id, ws in sockets.items()
+            ]
+            random.shuffle(moves)
+            await asyncio.gather(*moves)
+        await messenger.drain()
+    finally:
+        for user_id, ws in sockets.items():
+            messenger.disconnect(user_id, ws)
+
+    for battle_id in range(1, battles + 1):
+        assert store._battles[battle_id].current_round == rounds  # noqa
+    for user_id, ws in sockets.items():
+        assert [message.get('roundId') for message in ws.messages] == list(range(rounds)), (
+            user_id, ws.messages
+        )
+    # locks are evicted once all moves are handled
+    assert len(store._locks) == 0  # noqa
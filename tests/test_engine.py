@@ -0,0 +1,57 @@
+import itertools
+
+import pytest
+
+from app.schemas.enum import RockPaperScissorsChoice
+from app.services import engine
+
+pytestmark = pytest.mark.no_db
+
+
+ROCK, PAPER, SCISSORS = (choice.value for choice in RockPaperScissorsChoice)
+
+
+def test_outcomes():
+    beats = {ROCK: SCISSORS, PAPER: ROCK, SCISSORS: PAPER}
+    for first, second in itertools.product(beats, repeat=2):
+        if first == second:
+            expected = engine.DRAW
+        elif beats[first] == second:
+            expected = engine.FIRST
+        else:
+            expected = engine.SECOND
+
+        assert engine.round_outcome(first, second) == expected, (first, second)
+
+
+def test_round_winner():
+    assert engine.round_winner([(1, ROCK), (2, SCISSORS)]) == 1
+    assert engine.round_winner([(1, ROCK), (2, PAPER)]) == 2
+    assert engine.round_winner([(1, PAPER), (2, PAPER)]) is None
+
+
+def test_resolve_rounds_seed():
+    first = [ROCK] * 50
+    second = [SCISSORS] * 50
+    _, damage = engine.resolve_rounds(first, second, seed=7)
+    _, same_damage = engine.resolve_rounds(first, second, seed=7)
+
+    # reproducible within the installed path
+    assert list(damage) == list(same_damage)
+
+
+def test_resolve_rounds():
+    first = [ROCK, ROCK, PAPER, SCISSORS]
+    second = [SCISSORS, PAPER, PAPER, PAPER]
+    outcomes, damage = engine.resolve_rounds(first, second, seed=1)
+
+    assert list(outcomes) == [engine.FIRST, engine.SECOND, engine.DRAW, engine.FIRST]
+    assert damage[2] == 0
+    assert all(
+        engine.settings.BATTLE_USER_DAMAGE_MIN <= damage[i] <= engine.settings.BATTLE_USER_DAMAGE_MAX
+        for i in (0, 1, 3)
+    )
+    assert engine.replay_hp(outcomes, damage, hp=100) == (
+        100 - damage[1],
+        100 - damage[0] - damage[3],
+    )
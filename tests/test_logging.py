@@ -0,0 +1,29 @@
+import io
+import logging
+import threading
+
+import pytest
+
+from app.logging import QueueHandler
+
+pytestmark = pytest.mark.no_db
+
+
+class _ThreadFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return f'{threading.current_thread() is threading.main_thread()} {record.getMessage()}'
+
+
+def test_queue_handler_formats_off_thread():
+    stream = io.StringIO()
+    handler = QueueHandler(stream)
+    handler.setFormatter(_ThreadFormatter())
+    test_logger = logging.getLogger('battle_app.test_logging')
+    test_logger.addHandler(handler)
+    try:
+        test_logger.warning('message %s', 1)
+    finally:
+        test_logger.removeHandler(handler)
+        handler.close()
+
+    assert stream.getvalue() == 'False message 1\n'
@@ -0,0 +1,114 @@
+import pytest
+
+from app.config import settings
+from app.services import MatchmakingQueue
+
+
+@pytest.mark.no_db
+def test_matchmaking_queue_fifo():
+    queue = MatchmakingQueue()
+    ws = object()
+
+    assert queue.match(1, ws) is None
+    assert queue.match(2, ws).user_id == 1
+    assert len(queue) == 0
+
+    assert queue.match(3, ws) is None
+    queue.requeue(queue.match(4, ws))
+    assert queue.match(5, ws).user_id == 3
+
+
+@pytest.mark.no_db
+def test_matchmaking_queue_buckets(clock):
+    queue = MatchmakingQueue()
+    ws = object()
+    far = settings.BATTLE_MATCHMAKING_BUCKET_SIZE
+
+    assert queue.match(1, ws, rating=0) is None
+    # the neighbour bucket is not searched until the waiting user widens
+    assert queue.match(2, ws, rating=far) is None
+    assert len(queue) == 2
+
+    clock.advance(settings.BATTLE_MATCHMAKING_WIDEN_INTERVAL)
+    opponent = queue.match(3, ws, rating=far * 2)
+
+    # the closest widened bucket wins, user 1 is two buckets away
+    assert opponent is not None and opponent.user_id == 2
+    assert 1 in queue and 2 not in queue and 3 not in queue
+    assert len(queue) == 1
+
+
+@pytest.mark.no_db
+def test_matchmaking_queue_discard():
+    queue = MatchmakingQueue()
+    ws, other_ws = object(), object()
+
+    queue.match(1, ws)
+    queue.discard(1, other_ws)
+    assert 1 in queue
+
+    queue.discard(1, ws)
+    assert 1 not in queue
+    assert queue.match(2, ws) is None
+
+
+def test_battles_queue(client):
+    john, jack = 1, 2
+
+    with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(john)}) as john_ws:
+        with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(jack)}) as jack_ws:
+            john_ws.send_json({
+                'action': 'battles_queue',
+                'payload': {
+                    'userId': john,
+                }
+            })
+            assert john_ws.receive_json() == {'userId': john, 'rating': None}
+
+            john_ws.send_json({
+                'action': 'battles_queue',
+                'payload': {
+                    'userId': john,
+                }
+            })
+            assert john_ws.receive_json()['error'] == 'You are already in the queue'
+
+            jack_ws.send_json({
+                'action': 'battles_queue',
+                'payload': {
+                    'userId': jack,
+                }
+            })
+            john_battle = john_ws.receive_json()
+            assert jack_ws.receive_json() == john_battle and 'battleId' in john_battle
+
+            # the battle is playable right away
+            for user_id, ws, choice in ((john, john_ws, 0), (jack, jack_ws, 2)):
+                ws.send_json({
+                    'action': 'battles_move',
+                    'payload': {
+                        'userId': user_id,
+                        'battleId': john_battle['battleId'],
+                        'round': 0,
+                        'choice': choice,
+                    }
+                })
+            assert john_ws.receive_json()['roundWinner']['userId'] == john
+
+    # the offer of the matched users is neither listed nor accepted
+    bill = 3
+    with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(bill)}) as bill_ws:
+        bill_ws.send_json({
+            'action': 'battles_list',
+            'payload': {},
+        })
+        assert bill_ws.receive_json() == []
+
+        bill_ws.send_json({
+            'action': 'battles_accept',
+            'payload': {
+                'userId': bill,
+                'offerId': 1,  # the only offer, created by the match
+            }
+        })
+        assert bill_ws.receive_json()['error'] == 'Battle has already been taken'
@@ -0,0 +1,129 @@
+import asyncio
+import typing as t
+
+import pytest
+from fastapi import status
+from starlette.websockets import WebSocketState
+
+from app.events import events
+from app.ws import Connection, LocalBackend, Messenger, OverflowPolicy, QueueStats
+from app.ws.encoding import dumps
+
+pytestmark = pytest.mark.no_db
+
+
+class _SlowWebSocket:
+    application_state = WebSocketState.CONNECTED
+
+    def __init__(self) -> None:
+        self.sent: list[str] = []
+        self.closed: t.Optional[int] = None
+        self.release = asyncio.Event()
+
+    async def send_text(self, data: str) -> None:
+        await self.release.wait()
+        self.sent.append(data)
+
+    async def close(self, code: int) -> None:
+        self.closed = code
+
+
+async def _fill_queue(policy: OverflowPolicy, keys: t.Sequence[t.Optional[str]]) -> tuple:
+    stats = QueueStats()
+    closed = []
+    ws = _SlowWebSocket()
+    connection = Connection(1, ws, stats, on_close=closed.append, maxsize=2, policy=policy)  # noqa
+    # the writer takes the first message and waits on the slow client
+    connection.put('0')
+    await asyncio.sleep(0)
+    for data, key in enumerate(keys, start=1):
+        connection.put(str(data), key)
+
+    ws.release.set()
+    await connection.wait_idle()
+    await asyncio.sleep(0)
+
+    return ws, stats, closed
+
+
+async def test_connection_drop_oldest():
+    ws, stats, closed = await _fill_queue(OverflowPolicy.DROP_OLDEST, [None, None, None])
+
+    assert ws.sent == ['0', '2', '3']
+    assert stats.dropped == 1 and not closed
+
+
+async def test_connection_coalesce():
+    ws, stats, _ = await _fill_queue(OverflowPolicy.COALESCE, ['list', None, 'list'])
+
+    assert ws.sent == ['0', '2', '3']
+    assert stats.dropped == 1
+
+
+async def test_connection_disconnect():
+    ws, stats, closed = await _fill_queue(OverflowPolicy.DISCONNECT, [None, None, None])
+
+    assert stats.evictions == 1 and len(closed) == 1
+    assert ws.closed == status.WS_1013_TRY_AGAIN_LATER
+
+
+async def test_connection_message_delivered_event():
+    ws = _SlowWebSocket()
+    ws.release.set()
+    connection = Connection(1, ws, QueueStats(), on_close=lambda _: None)  # noqa
+    delivered = asyncio.create_task(
+        events.wait_for('message_delivered', lambda event: event['data'] == '1', timeout=1)
+    )
+    await asyncio.sleep(0)
+    connection.put('0')
+    connection.put('1')
+
+    assert (await delivered)['user_id'] == 1
+    assert ws.sent == ['0', '1']
+    connection.close()
+
+
+async def test_messenger_send_to_ws_queues_to_connection(monkeypatch):
+    put = []
+    connection_put = Connection.put
+
+    def _put(connection: Connection, data, key=None) -> bool:
+        put.append(data)
+        return connection_put(connection, data, key)
+
+    monkeypatch.setattr(Connection, 'put', _put)
+    messenger = Messenger(LocalBackend())
+    ws = _SlowWebSocket()
+    ws.release.set()
+    messenger.connect(1, ws)  # noqa
+    # the connection is idle, its queue is empty
+    await messenger.send_to_ws(ws, {'offerId': 1})  # noqa
+    await messenger.drain()
+
+    assert put == [dumps({'offerId': 1})]
+    assert ws.sent == put
+    messenger.disconnect(1, ws)  # noqa
+
+
+async def test_messenger_deliver_evicts_slow_connections():
+    messenger = Messenger(LocalBackend())
+    slow, fast = _SlowWebSocket(), _SlowWebSocket()
+    fast.release.set()
+    for ws in (slow, fast):
+        messenger.connect(1, ws)  # noqa
+    connections = {ws: messenger._connections[ws] for ws in (slow, fast)}  # noqa
+    connections[slow]._maxsize = 1  # noqa
+    connections[slow]._policy = OverflowPolicy.DISCONNECT  # noqa
+
+    # the slow writer takes the first message and waits on the client
+    await messenger.deliver([1], '0')
+    await asyncio.sleep(0)
+    for data in ('1', '2'):
+        await messenger.deliver([1], data)
+    await connections[fast].wait_idle()
+    await connections[slow].wait_closed()
+
+    assert fast.sent == ['0', '1', '2']
+    assert slow.closed == status.WS_1013_TRY_AGAIN_LATER
+    assert messenger.stats()['connections'] == 1 and messenger.stats()['evictions'] == 1
+    await messenger.disconnect_all()
@@ -0,0 +1,61 @@
+import pytest
+
+from app.config import settings
+from app.metrics import Counter, Histogram
+
+
+@pytest.mark.no_db
+def test_histogram_render():
+    histogram = Histogram('latency_seconds', 'Latency', ('action',), buckets=(0.1, 1.0))
+    histogram.observe(0.05, 'move')
+    histogram.observe(0.5, 'move')
+    histogram.observe(5, 'move')
+    counter = Counter('errors_total', 'Errors', ('type',))
+    counter.inc('a"b')
+
+    assert list(histogram.render())[2:] == [
+        'latency_seconds_bucket{action="move",le="0.1"} 1',
+        'latency_seconds_bucket{action="move",le="1.0"} 2',
+        'latency_seconds_bucket{action="move",le="+Inf"} 3',
+        'latency_seconds_sum{action="move"} 5.55',
+        'latency_seconds_count{action="move"} 3',
+    ]
+    assert list(counter.render())[2:] == ['errors_total{type="a\\"b"} 1']
+
+
+def test_metrics_route(client):
+    user_id = 1
+    with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(user_id)}) as ws:
+        ws.send_json({
+            'action': 'battles_create',
+            'payload': {
+                'userId': user_id,
+            }
+        })
+        ws.receive_json()
+        ws.send_json({
+            'action': 'battles_move',
+            'payload': {
+                'userId': user_id,
+                'battleId': 1,
+                'round': 0,
+                'choice': 0,
+            }
+        })
+        assert ws.receive_json()['error'] == 'Battle does not exist'
+        ws.send_json({
+            'action': 'battles_move',
+            'payload': {},
+        })
+        assert ws.receive_json()['error'] == 'validationError'
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    body = response.text
+
+    assert 'battle_action_duration_seconds_count{action="battles_create"}' in body
+    assert 'battle_action_db_seconds_count{action="battles_create"}' in body
+    assert 'battle_action_errors_total{action="battles_move",type="domain"}' in body
+    assert 'battle_action_errors_total{action="battles_move",type="validation"}' in body
+    assert 'battle_ws_connections ' in body
+    assert 'battle_db_pool_size ' in body
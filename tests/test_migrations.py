@@ -0,0 +1,76 @@
+import json
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import settings
+from app.services.migrations import migrate_battle_log
+
+
+LEGACY_LOG = {
+    'users': {
+        'offer_creator': 1,
+        'offer_acceptor': 2,
+    },
+    'current_round': 1,
+    'winner': {
+        'user_id': 1,
+    },
+    'rounds': {
+        '0': {
+            'answers': [
+                {'user_id': 1, 'choice': 0},
+                {'user_id': 2, 'choice': 2},
+            ],
+            'round_winner': 1,
+            'round_damage': 10,
+        },
+    },
+}
+
+
+async def _execute(*statements: str, **params) -> list:
+    engine = create_async_engine(settings.SQLALCHEMY_DATABASE_URL)
+    try:
+        async with engine.begin() as connection:
+            result = None
+            for statement in statements:
+                result = await connection.execute(text(statement), params)
+            return result.all() if result.returns_rows else []
+    finally:
+        await engine.dispose()
+
+
+async def test_migrate_battle_log_twice():
+    # the legacy schema: battle state is kept in `battle.log` only
+    await _execute(
+        'ALTER TABLE battle ADD COLUMN log JSONB',
+        """
+        ALTER TABLE battle
+            ALTER COLUMN offer_creator_id DROP NOT NULL,
+            ALTER COLUMN offer_acceptor_id DROP NOT NULL,
+            ALTER COLUMN offer_creator_hp DROP NOT NULL,
+            ALTER COLUMN offer_acceptor_hp DROP NOT NULL
+        """,
+        'INSERT INTO battle_user (user_id) VALUES (1), (2)',
+        'INSERT INTO battle_offer (offer_id, user_id) VALUES (1, 1)',
+        'INSERT INTO battle_offer_accept (accept_id, offer_id, user_id) VALUES (1, 1, 2)',
+        "INSERT INTO battle (battle_id, accept_id, status, log) VALUES (1, 1, 'ACTIVE', CAST(:log AS JSONB))",
+        log=json.dumps(LEGACY_LOG)
+    )
+
+    for _ in range(2):
+        await migrate_battle_log(settings.SQLALCHEMY_DATABASE_URL, echo=False)
+
+    battles = await _execute(
+        """
+        SELECT status, offer_creator_hp, offer_acceptor_hp, winner_id, time_finished IS NOT NULL
+        FROM battle
+        """
+    )
+    assert battles == [('FINISHED', settings.BATTLE_USER_HP, settings.BATTLE_USER_HP - 10, 1, True)]
+    assert await _execute('SELECT round, round_winner_id, round_damage FROM battle_round') == [(0, 1, 10)]
+    assert len(await _execute('SELECT * FROM battle_answer')) == 2
+    assert await _execute(
+        "SELECT 1 FROM information_schema.columns WHERE table_name = 'battle' AND column_name = 'log'"
+    ) == []
@@ -0,0 +1,46 @@
+from app.config import settings
+
+
+def _create_offer(ws, user_id: int) -> int:
+    ws.send_json({
+        'action': 'battles_create',
+        'payload': {
+            'userId': user_id,
+        }
+    })
+    return ws.receive_json()['offerId']
+
+
+def _list_offers(ws, **payload) -> list[dict[str, int]]:
+    ws.send_json({
+        'action': 'battles_list',
+        'payload': payload,
+    })
+    return ws.receive_json()
+
+
+def test_battles_list_pagination(client):
+    user_id = 1
+
+    with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(user_id)}) as ws:
+        offer_ids = [_create_offer(ws, user_id) for _ in range(3)]
+
+        first_page = _list_offers(ws, limit=2)
+        assert [offer['offerId'] for offer in first_page] == offer_ids[:2], first_page
+
+        second_page = _list_offers(ws, limit=2, afterOfferId=first_page[-1]['offerId'])
+        assert [offer['offerId'] for offer in second_page] == offer_ids[2:], second_page
+
+        error = _list_offers(ws, limit=settings.BATTLE_OFFERS_LIMIT + 1)
+        assert error['error'] == 'validationError', error
+
+
+def test_battles_list_cache_invalidation(client):
+    user_id = 1
+
+    with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(user_id)}) as ws:
+        assert _list_offers(ws) == []
+
+        # a new offer invalidates the cached (empty) list
+        offer_id = _create_offer(ws, user_id)
+        assert [offer['offerId'] for offer in _list_offers(ws)] == [offer_id]
@@ -0,0 +1,67 @@
+from app.config import settings
+from app.services import battle_state_store
+
+
+def _move(ws, user_id: int, battle_id: int, battle_round: int, choice: int) -> None:
+    ws.send_json({
+        'action': 'battles_move',
+        'payload': {
+            'userId': user_id,
+            'battleId': battle_id,
+            'round': battle_round,
+            'choice': choice,
+        }
+    })
+
+
+def _resume(ws, user_id: int, battle_id: int, last_seq=None) -> None:
+    ws.send_json({
+        'action': 'battles_resume',
+        'payload': {
+            'userId': user_id,
+            'battleId': battle_id,
+            'lastSeq': last_seq,
+        }
+    })
+
+
+def test_battle_resume(client, clock, start_battle):
+    john, jack = 1, 2
+
+    with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(john)}) as john_ws:
+        with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(jack)}) as jack_ws:
+            battle_id = start_battle(john_ws, john, jack_ws, jack)
+            _move(john_ws, john, battle_id, 0, 0)
+            _move(jack_ws, jack, battle_id, 0, 2)
+            round_info = john_ws.receive_json()
+            assert jack_ws.receive_json() == round_info
+            assert round_info['seq'] == 1, round_info
+
+            # missed messages are replayed from the buffer
+            _resume(jack_ws, jack, battle_id, 0)
+            assert jack_ws.receive_json() == [round_info]
+            _resume(jack_ws, jack, battle_id, 1)
+            assert jack_ws.receive_json() == []
+            _resume(jack_ws, jack, battle_id)
+            missed = jack_ws.receive_json()
+            assert [message['seq'] for message in missed] == [0, 1], missed
+
+            # not a participant
+            _resume(jack_ws, john + jack, battle_id, 0)
+            assert jack_ws.receive_json()['error'] == 'You have not access to battle'
+
+            # the buffer is lost on restart, a snapshot is sent instead
+            client.portal.call(battle_state_store.stop)
+            client.portal.call(battle_state_store.start)
+            _resume(jack_ws, jack, battle_id, 0)
+            snapshot = jack_ws.receive_json()
+            assert snapshot['seq'] == 1, snapshot
+            assert snapshot['currentRound'] == 1, snapshot
+            assert snapshot['moved'] is False, snapshot
+            assert snapshot['rounds'] == [
+                {key: value for key, value in round_info.items() if key != 'seq'}
+            ], snapshot
+            assert snapshot['hp'] == [
+                {'userId': john, 'hp': settings.BATTLE_USER_HP},
+                {'userId': jack, 'hp': settings.BATTLE_USER_HP - round_info['roundDamage']},
+            ], snapshot
@@ -0,0 +1,71 @@
+import app.db.models as m
+from app.config import settings
+from app.schemas.enum import BattleStatus
+from app.services import battle_state_store, BattleState
+
+
+def test_battle_state_from_orm():
+    john, jack = 1, 2
+    battle = m.Battle(
+        battle_id=1,
+        status=BattleStatus.ACTIVE,
+        offer_creator_id=john,
+        offer_acceptor_id=jack,
+        current_round=1,
+        offer_creator_hp=100,
+        offer_acceptor_hp=90
+    )
+    answers = [
+        (m.BattleAnswer(battle_id=1, round=0, user_id=john, choice=0), None),
+        (m.BattleAnswer(battle_id=1, round=0, user_id=jack, choice=2), None),
+        (m.BattleAnswer(battle_id=1, round=1, user_id=jack, choice=1), None),
+    ]
+    battle_round = m.BattleRound(battle_id=1, round=0, round_winner_id=john, round_damage=10)
+    answers[0] = (answers[0][0], battle_round)
+    answers[1] = (answers[1][0], battle_round)
+
+    state = BattleState.from_orm(battle, answers)
+
+    assert state.user_ids == (john, jack)
+    assert state.hp == [100, 90]
+    assert state.rounds[0].answers == [(john, 0), (jack, 2)]
+    assert state.rounds[0].round_winner == john
+    assert state.current.answers == [(jack, 1)]
+    assert BattleState.replay_hp(state.user_ids, state.rounds) == state.hp
+
+
+def test_battle_state_recovery(client, start_battle):
+    john, jack = 1, 2
+
+    with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(john)}) as john_ws:
+        with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(jack)}) as jack_ws:
+            battle_id = start_battle(john_ws, john, jack_ws, jack)
+            john_ws.send_json({
+                'action': 'battles_move',
+                'payload': {
+                    'userId': john,
+                    'battleId': battle_id,
+                    'round': 0,
+                    'choice': 0,
+                }
+            })
+            # wrong round number, just to make sure the move above was handled
+            john_ws.send_json({
+                'action': 'battles_move',
+                'payload': {
+                    'userId': john,
+                    'battleId': battle_id,
+                    'round': 0,
+                    'choice': 0,
+                }
+            })
+            assert john_ws.receive_json()['error'] == 'Wrong battle round number'
+
+            # restart: pending changes are flushed, active battles are reloaded
+            client.portal.call(battle_state_store.stop)
+            assert len(battle_state_store) == 0
+            client.portal.call(battle_state_store.start)
+
+            state = client.portal.call(battle_state_store.get, battle_id, None)
+            assert state is not None and state.is_active
+            assert state.current.answers == [(john, 0)]
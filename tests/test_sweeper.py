@@ -0,0 +1,62 @@
+from sqlalchemy import update
+
+import app.db.models as m
+from app.config import settings
+from app.db import DBSession
+from app.schemas.enum import BattleStatus
+from app.services import battle_state_store, sweep
+
+
+async def _sweep_all() -> dict[str, int]:
+    async with DBSession() as db_session:
+        # everything created before now is out of retention
+        return await sweep(
+            db_session,
+            battle_retention=-60,
+            offer_retention=-(settings.BATTLE_OFFER_EXPIRES + 60),
+            batch_size=1
+        )
+
+
+def test_sweep(client, start_battle):
+    john, jack = 1, 2
+
+    with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(john)}) as john_ws:
+        with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(jack)}) as jack_ws:
+            start_battle(john_ws, john, jack_ws, jack)
+            for _ in range(2):
+                john_ws.send_json({
+                    'action': 'battles_create',
+                    'payload': {
+                        'userId': john,
+                    }
+                })
+                john_ws.receive_json()
+
+            # the offer of the active battle is kept
+            assert client.portal.call(_sweep_all) == {'battles': 0, 'offers': 2}
+            assert client.portal.call(_sweep_all) == {'battles': 0, 'offers': 0}
+
+
+async def _finish_without_time(battle_id: int) -> None:
+    # a legacy row: finished before `time_finished` existed
+    async with DBSession() as db_session:
+        await db_session.execute(
+            update(m.Battle)
+                .where(m.Battle.battle_id == battle_id)
+                .values(status=BattleStatus.FINISHED, time_finished=None)
+        )  # noqa
+        await db_session.commit()
+
+
+def test_sweep_finished_battle_without_time(client, start_battle):
+    john, jack = 1, 2
+
+    with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(john)}) as john_ws:
+        with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(jack)}) as jack_ws:
+            battle_id = start_battle(john_ws, john, jack_ws, jack)
+
+    client.portal.call(battle_state_store.stop)
+    client.portal.call(_finish_without_time, battle_id)
+
+    assert client.portal.call(_sweep_all) == {'battles': 1, 'offers': 1}
@@ -0,0 +1,107 @@
+import pytest
+
+from app.config import settings
+from app.events import events
+from app.services import round_timer, RoundTimer
+
+
+@pytest.mark.no_db
+async def test_round_timer_expire(clock):
+    expired = []
+
+    async def on_expire(battle_id: int, battle_round: int) -> None:
+        expired.append((battle_id, battle_round))
+
+    timer = RoundTimer(timeout=10)
+    await timer.start(on_expire, [(1, 0)])
+    try:
+        clock.advance(5)
+        timer.schedule(2, 3)
+        assert await timer.expire() == 0
+
+        clock.advance(5)
+        assert await timer.expire() == 1
+        assert expired == [(1, 0)]
+        clock.advance(5)
+        assert await timer.expire() == 1
+        assert expired == [(1, 0), (2, 3)]
+        assert len(timer) == 0
+    finally:
+        await timer.stop()
+
+
+@pytest.mark.no_db
+async def test_round_timer_retry(clock):
+    attempts = []
+
+    async def on_expire(battle_id: int, battle_round: int) -> None:
+        attempts.append((battle_id, battle_round))
+        if len(attempts) == 1:
+            raise RuntimeError('database is not available')
+
+    timer = RoundTimer(timeout=10, retry_delay=1)
+    await timer.start(on_expire, [(1, 0)])
+    try:
+        clock.advance(10)
+        assert await timer.expire() == 1
+        # the failed round is kept for a retry
+        assert len(timer) == 1 and timer.stats()['retries'] == 1
+
+        assert await timer.expire() == 0
+        clock.advance(1)
+        assert await timer.expire() == 1
+        assert attempts == [(1, 0), (1, 0)]
+        assert len(timer) == 0
+    finally:
+        await timer.stop()
+
+
+def test_round_timeout(client, clock, start_battle):
+    john, jack = 1, 2
+
+    with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(john)}) as john_ws:
+        with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(jack)}) as jack_ws:
+            battle_id = start_battle(john_ws, john, jack_ws, jack)
+            john_ws.send_json({
+                'action': 'battles_move',
+                'payload': {
+                    'userId': john,
+                    'battleId': battle_id,
+                    'round': 0,
+                    'choice': 0,
+                }
+            })
+            # wrong round number, just to make sure the move above was handled
+            john_ws.send_json({
+                'action': 'battles_move',
+                'payload': {
+                    'userId': john,
+                    'battleId': battle_id,
+                    'round': 0,
+                    'choice': 0,
+                }
+            })
+            assert john_ws.receive_json()['error'] == 'Wrong battle round number'
+
+            # Jack has not moved in time and forfeits the round
+            clock.advance(settings.BATTLE_ROUND_TIMEOUT)
+            assert client.portal.call(round_timer.expire) == 1
+            round_info = john_ws.receive_json()
+            assert jack_ws.receive_json() == round_info
+            assert round_info['seq'] == 1, round_info
+            assert round_info['roundWinner']['userId'] == john, round_info
+            assert round_info['answers'] == [{'userId': john, 'choice': 0}], round_info
+
+            # nobody moves, the battle is finished without a winner
+            with events.record('battle_finished') as finished:
+                clock.advance(settings.BATTLE_ROUND_TIMEOUT)
+                assert client.portal.call(round_timer.expire) == 1
+            battle_info = john_ws.receive_json()
+            assert jack_ws.receive_json() == battle_info
+            assert battle_info['winner']['userId'] is None, battle_info
+            assert battle_info['roundCount'] == 2, battle_info
+            assert [event['battle_info'] for event in finished] == [battle_info]
+
+            # finished battles are not expired again
+            clock.advance(settings.BATTLE_ROUND_TIMEOUT)
+            assert client.portal.call(round_timer.expire) == 0
@@ -27,3 +27,143 @@ def test_ws_auth_with_user_headers(client):
         data: dict = websocket.receive_json()
 
         assert 'userId' in data and data['userId'] == user_id, data
+
+
+def test_ws_batch(client):
+    user_id = 1
+    headers = {
+        settings.BATTLE_USERNAME_HEADER: str(user_id),
+    }
+
+    with client.websocket_connect('/', headers=headers) as websocket:
+        websocket.send_json([
+            {
+                'id': 'create',
+                'action': 'battles_create',
+                'payload': {
+                    'userId': user_id,
+                }
+            },
+            {
+                'id': 'list',
+                'action': 'battles_list',
+                'payload': {},
+            },
+            {
+                'id': 'unknown',
+                'action': 'battles_unknown',
+                'payload': {},
+            },
+        ])
+        create, offers, unknown = websocket.receive_json()
+
+        assert create['id'] == 'create' and create['payload']['userId'] == user_id, create
+        assert offers['id'] == 'list', offers
+        assert [offer['offerId'] for offer in offers['payload']] == [create['payload']['offerId']]
+        assert unknown['payload']['error'] == 'Unexpected action', unknown
+
+
+def test_ws_batch_collects_broadcasts(client):
+    john, jack = 1, 2
+
+    with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(john)}) as john_ws:
+        with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(jack)}) as jack_ws:
+            john_ws.send_json({
+                'action': 'battles_queue',
+                'payload': {
+                    'userId': john,
+                }
+            })
+            assert john_ws.receive_json() == {'userId': john, 'rating': None}
+
+            jack_ws.send_json([
+                {
+                    'id': 'queue',
+                    'action': 'battles_queue',
+                    'payload': {
+                        'userId': jack,
+                    }
+                },
+                {
+                    'id': 'list',
+                    'action': 'battles_list',
+                    'payload': {},
+                },
+            ])
+            # the battle sent to both users is a part of the batch reply, not ahead of it
+            queue, offers = jack_ws.receive_json()
+            john_battle = john_ws.receive_json()
+
+            assert queue['id'] == 'queue' and queue['payload'] == john_battle, queue
+            assert offers['id'] == 'list' and offers['payload'] == [], offers
+
+
+def test_ws_binary_subprotocol(client):
+    msgpack = pytest.importorskip('msgpack')
+    from app.ws import binary_codec
+
+    user_id = 1
+    headers = {
+        settings.BATTLE_USERNAME_HEADER: str(user_id),
+    }
+
+    with client.websocket_connect(
+        '/',
+        headers=headers,
+        subprotocols=[binary_codec.subprotocol]
+    ) as websocket:
+        assert websocket.accepted_subprotocol == binary_codec.subprotocol
+        websocket.send_bytes(bytes((binary_codec.MSGPACK,)) + msgpack.packb({
+            'action': 'battles_create',
+            'payload': {
+                'userId': user_id,
+            }
+        }))
+        data: dict = binary_codec.decode(websocket.receive_bytes())
+
+        assert 'userId' in data and data['userId'] == user_id, data
+
+        # errors are replied with the negotiated codec too
+        websocket.send_bytes(binary_codec.encode_move(1, user_id, 0, 0))
+        error: dict = binary_codec.decode(websocket.receive_bytes())
+
+        assert error['error'] == 'Battle does not exist', error
+
+
+@pytest.mark.no_db
+@pytest.mark.parametrize('round_winner', (0, 2, None))
+def test_binary_codec_round_winner(round_winner):
+    from app.ws import binary_codec
+
+    round_info = {
+        'seq': 1,
+        'roundId': 1,
+        'roundWinner': {
+            'userId': round_winner,
+        },
+        'roundDamage': 0 if round_winner is None else 10,
+        'answers': [
+            {'userId': 0, 'choice': 1},
+            {'userId': 2, 'choice': 2},
+        ],
+    }
+
+    # user id 0 is a valid winner, not a draw
+    assert binary_codec.decode(binary_codec.encode(round_info)) == round_info
+
+
+def test_ws_provisions_user(client):
+    from app.db import BattleUser, DBSession
+    from app.services import known_users
+
+    async def _get_user(user_id: int):
+        async with DBSession() as db_session:
+            return await db_session.get(BattleUser, user_id)
+
+    user_id = 1
+    for _ in range(2):
+        with client.websocket_connect('/', headers={settings.BATTLE_USERNAME_HEADER: str(user_id)}):
+            pass
+
+    assert user_id in known_users
+    assert client.portal.call(_get_user, user_id) is not None